@@ -1,160 +1,297 @@
+import time
+SCRIPT_START = time.perf_counter()  # first-paint clock; keep above the imports
+
+import os
 import streamlit as st 
 import sqlite3
-import hashlib
-import pandas as pd
-
-# --- Password hashing ---
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-
-# --- Password hashing ---
-def initialize_database():
-    conn = sqlite3.connect("hrm.db")
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-
-    # DO NOT DROP TABLES
-    # Tables are created only if they do not already exist
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS department (
-            department_id TEXT PRIMARY KEY,
-            department_name TEXT UNIQUE NOT NULL
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS employee (
-            emp_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            address TEXT,
-            dob DATE,
-            position TEXT,
-            department_id TEXT
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS salary (
-            emp_id TEXT,
-            amount INTEGER NOT NULL,
-            payment_date DATE NOT NULL,
-            bank_details TEXT,
-            total_monthly_stipend INTEGER,
-            amount_deducted INTEGER,
-            payment_method TEXT,
-            FOREIGN KEY (emp_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
-            PRIMARY KEY (emp_id, payment_date)
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS attendance (
-            employee_id TEXT,
-            date DATE NOT NULL,
-            status TEXT CHECK(status IN ('Present', 'Absent')),
-            FOREIGN KEY (employee_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
-            PRIMARY KEY (employee_id, date)
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS leave_record (
-            emp_id TEXT,
-            leave_type TEXT,
-            start_date DATE,
-            end_date DATE,
-            status TEXT,
-            FOREIGN KEY (emp_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
-            PRIMARY KEY (emp_id, start_date, end_date)
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS rules (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            rule_title TEXT NOT NULL,
-            rule_description TEXT NOT NULL
-        );
-    """)
-
-    # Insert sample rules if empty
-    cursor.execute("SELECT COUNT(*) FROM rules")
-    if cursor.fetchone()[0] == 0:
-        sample_rules = [
-            ("Code of Conduct", "Employees must maintain professional behavior at all times. Harassment, discrimination, or unethical behavior is strictly prohibited."),
-            ("Working Hours", "Standard working hours are 9:00 AM to 6:00 PM, Monday to Friday. Late arrivals must be reported to HR in advance."),
-            ("Attendance Policy", "Minimum 90% monthly attendance is mandatory. Continuous absence of 3 days without notice may result in disciplinary action."),
-            ("Leave Policy", "Leave requests must be submitted at least 3 days in advance. Emergency leave must be informed the same day."),
-            ("Salary and Payroll", "Salaries are processed on the 1st of every month. Salary deductions apply for unapproved absences and late arrivals."),
-            ("Dress Code", "Employees are expected to wear formal or business casual attire. Dress-down Fridays are permitted unless stated otherwise."),
-            ("Data Security and Confidentiality", "Sharing of confidential company data without authorization is a serious offense. Employees must adhere to all IT and security policies."),
-            ("Performance Evaluation", "Regular appraisals are conducted every 6 or 12 months. Promotions and bonuses are performance-based."),
-            ("Grievance Redressal", "Employees may approach HR with any complaints or grievances. All issues will be addressed confidentially and fairly."),
-            ("Exit Policy", "A minimum of 30 days’ notice is required for resignation. Exit interviews and handovers must be completed before departure.")
-        ]
-        cursor.executemany("INSERT INTO rules (rule_title, rule_description) VALUES (?, ?)", sample_rules)
-
-    conn.commit()
-    conn.close()
-
-# --- Display table helper ---
-def display_table_with_scroll(df):
-    df_display = df.copy()
-    df_display.columns = [col.replace('_', ' ').title() for col in df_display.columns]
-    st.markdown("""
-        <style>
-        .table-container {
-            overflow-x: auto;
-            width: 100%;
-            margin-bottom: 1rem;
-        }
-        table {
-            width: 100% !important;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-    st.markdown('<div class="table-container">', unsafe_allow_html=True)
-    st.dataframe(df_display, use_container_width=True)
-    st.markdown('</div>', unsafe_allow_html=True)
+
+import audit
+import auth
+import db
+from display import display_table_with_scroll
+import jobs
+import leave_calendar
+import metrics
+import migrations
+import summaries
+import tenants
+
+# --- One-time setup ---
+# Once per process and shard, not once per browser session
+@st.cache_resource(show_spinner=False)
+def initialize_database(path):
+    migrations.migrate(path)
+    pool = db.get_pool(path)
+    with pool.writer() as conn:
+        cursor = conn.cursor()
+
+        # Insert sample rules if empty
+        cursor.execute("SELECT COUNT(*) FROM rules")
+        if cursor.fetchone()[0] == 0:
+            sample_rules = [
+                ("Code of Conduct", "Employees must maintain professional behavior at all times. Harassment, discrimination, or unethical behavior is strictly prohibited."),
+                ("Working Hours", "Standard working hours are 9:00 AM to 6:00 PM, Monday to Friday. Late arrivals must be reported to HR in advance."),
+                ("Attendance Policy", "Minimum 90% monthly attendance is mandatory. Continuous absence of 3 days without notice may result in disciplinary action."),
+                ("Leave Policy", "Leave requests must be submitted at least 3 days in advance. Emergency leave must be informed the same day."),
+                ("Salary and Payroll", "Salaries are processed on the 1st of every month. Salary deductions apply for unapproved absences and late arrivals."),
+                ("Dress Code", "Employees are expected to wear formal or business casual attire. Dress-down Fridays are permitted unless stated otherwise."),
+                ("Data Security and Confidentiality", "Sharing of confidential company data without authorization is a serious offense. Employees must adhere to all IT and security policies."),
+                ("Performance Evaluation", "Regular appraisals are conducted every 6 or 12 months. Promotions and bonuses are performance-based."),
+                ("Grievance Redressal", "Employees may approach HR with any complaints or grievances. All issues will be addressed confidentially and fairly."),
+                ("Exit Policy", "A minimum of 30 days’ notice is required for resignation. Exit interviews and handovers must be completed before departure.")
+            ]
+            cursor.executemany("INSERT INTO rules (rule_title, rule_description) VALUES (?, ?)", sample_rules)
+    pool.bump(("rules",))
+    # Starting the job executor fails jobs that died with the last process and
+    # resubmits queued ones, so they run now rather than at the next submit
+    jobs.get_executor(path)
+    return True
+
+# --- Listing filters ---
+FILTER_CHOICES = {
+    "status": {
+        "attendance": ["All", "Present", "Absent"],
+        "leave_record": ["All", "Pending", "Approved", "Rejected"],
+    },
+    "leave_type": ["All", "Sick Leave", "Casual Leave", "Paid Leave", "Other"],
+    "payment_method": ["All", "Bank Transfer", "Cash", "UPI", "Other"],
+}
+
+def listing_filters(table):
+    # Renders the filter controls this listing supports and returns the values
+    available = db.LISTING_FILTERS.get(table, {})
+    values = {}
+    with st.expander("Filters"):
+        cols = st.columns(2)
+        if "date_from" in available:
+            values["date_from"] = cols[0].date_input("From", value=None, key=f"{table}_filter_from")
+            values["date_to"] = cols[1].date_input("To", value=None, key=f"{table}_filter_to")
+        if "employee" in available:
+            values["employee"] = cols[0].text_input("Employee ID", key=f"{table}_filter_employee").strip()
+        if "department" in available:
+            departments = db.read_column("SELECT department_id FROM department", path=db_path, tables=("department",))
+            values["department"] = cols[1].selectbox("Department", ["All"] + departments, key=f"{table}_filter_department")
+        if "status" in available:
+            values["status"] = cols[0].selectbox("Status", FILTER_CHOICES["status"][table], key=f"{table}_filter_status")
+        if "leave_type" in available:
+            values["leave_type"] = cols[1].selectbox("Leave Type", FILTER_CHOICES["leave_type"], key=f"{table}_filter_leave_type")
+        if "payment_method" in available:
+            values["payment_method"] = cols[1].selectbox("Payment Method", FILTER_CHOICES["payment_method"], key=f"{table}_filter_payment_method")
+    return values
+
+# --- Paginated table helper ---
+PAGE_SIZES = [25, 50, 100, 250]
+
+def display_paginated_table(table):
+    # Cursor stack of last-seen keys; [None] is the first page
+    select, keys, tables = db.LISTING_QUERIES[table]
+    filters = listing_filters(table)
+    where, params = db.build_where(table, filters)
+    if where:
+        tables = tables + ("employee",)
+    cursors_key = f"{table}_cursors"
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{table}_page_size")
+    # A new page size or filter starts over from the first page
+    view = (page_size, tuple(where), tuple(params))
+    if st.session_state.get(f"{table}_last_view") != view:
+        st.session_state[cursors_key] = [None]
+        st.session_state[f"{table}_last_view"] = view
+    cursors = st.session_state[cursors_key]
+
+    page, next_key = db.fetch_page_arrow(
+        select, keys, after=cursors[-1], page_size=page_size, path=db_path, tables=tables, where=where, params=params
+    )
+    display_table_with_scroll(page)
+
+    first = (len(cursors) - 1) * page_size
+    total = db.count_rows(table, path=db_path, where=where, params=params)
+    st.caption(f"Rows {first + 1 if page.num_rows else 0}–{first + page.num_rows} of {total}")
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("Previous", key=f"{table}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if next_col.button("Next", key=f"{table}_next", disabled=next_key is None):
+        cursors.append(next_key)
+        st.rerun()
+    export_section(table, filters)
+    return page
+
+# --- Export helper ---
+def export_section(table, filters):
+    with st.expander("Export"):
+        st.caption("Exports every row matching the filters, not just this page.")
+        fmt = st.radio("Format", list(exporter.FORMATS), horizontal=True, key=f"{table}_export_format")
+        if st.button("Export", key=f"{table}_export"):
+            st.session_state[f"{table}_export_job"] = jobs.submit("export", {
+                "table": table,
+                "format": fmt,
+                "filters": {name: db.sql_value(value) for name, value in filters.items()},
+            }, path=db_path)
+        job = job_status(f"{table}_export_job")
+        if job and job["status"] == "done" and os.path.exists(job["result"]["file"]):
+            result = job["result"]
+            with open(result["file"], "rb") as f:
+                st.download_button(
+                    f"Download {result['rows']} rows", f, file_name=os.path.basename(result["file"]),
+                    mime=exporter.FORMATS[result["format"]], key=f"{table}_export_download",
+                )
+
+# --- Bulk import helper ---
+def bulk_import_section(table):
+    with st.expander("Bulk Import (CSV / Excel)"):
+        st.caption("Columns: " + ", ".join(importer.IMPORT_SPECS[table]["columns"]) + ". Dates as YYYY-MM-DD.")
+        upload = st.file_uploader("Upload file", type=["csv", "xlsx"], key=f"{table}_import_file")
+        if upload is not None and st.button("Import", key=f"{table}_import"):
+            st.session_state[f"{table}_import_job"] = jobs.submit(
+                "import", {"table": table, "filename": upload.name}, upload.getvalue(), path=db_path
+            )
+            audit_event("import", table, detail={"job": st.session_state[f"{table}_import_job"], "filename": upload.name})
+        job = job_status(f"{table}_import_job")
+        if job and job["status"] == "done":
+            result = job["result"]
+            st.success(f"✅ Imported {result['inserted']} rows.")
+            if result["rejected"]:
+                st.warning(f"⚠️ {result['rejected']} rows rejected.")
+                st.dataframe(pd.DataFrame(result["rejects"], columns=["Row", "Reason"]), hide_index=True)
+
+# --- Background jobs ---
+@st.fragment(run_every=jobs.POLL_SECONDS)
+def poll_job(key):
+    # Reruns on its own every POLL_SECONDS; the full page reruns once the job ends
+    job = jobs.get(st.session_state[key], st.session_state.db_path)
+    if job is None or job["status"] not in jobs.ACTIVE:
+        st.rerun()
+    st.caption(f"⏳ Job #{job['id']} ({job['kind']}) {job['status']}: {job['message'] or 'waiting for a worker'}")
+
+def job_status(key):
+    # Shows the job whose id is stored under key; returns it once finished
+    job_id = st.session_state.get(key)
+    job = jobs.get(job_id, db_path) if job_id is not None else None
+    if job is None:
+        return None
+    if job["status"] in jobs.ACTIVE:
+        poll_job(key)
+        return None
+    seen = st.session_state.setdefault("finished_jobs", set())
+    if job_id not in seen:
+        # A job run in another process could not expire this process's caches
+        seen.add(job_id)
+        db.get_pool(db_path).bump(job["result"]["tables"] if job["result"] else ())
+    if job["status"] == "failed":
+        st.error(f"❌ Job #{job_id} failed: {job['error']}")
+    return job
+
+# --- Debug panel ---
+def render_debug_panel():
+    spans = metrics.current_spans()
+    with st.expander("Debug: timings for this rerun", expanded=True):
+        if not spans:
+            st.caption("Nothing recorded yet.")
+            return
+        df = pd.DataFrame(spans)
+        sql = df[df["kind"] == "sql"]
+        st.caption(
+            f"{len(sql)} SQL statements, {sql['ms'].sum():.1f} ms in SQL, "
+            f"{df.loc[df['kind'] == 'render', 'ms'].sum():.1f} ms in timed render sections. "
+            "Reads served from cache run no SQL."
+        )
+        st.dataframe(df.round({"ms": 2}), hide_index=True, use_container_width=True)
+        columns, rows = jobs.recent(path=db_path)
+        if rows:
+            st.caption("Recent background jobs")
+            st.dataframe(pd.DataFrame(rows, columns=columns), hide_index=True, use_container_width=True)
+
+# --- Audit helper ---
+def audit_event(action, table, key=(), detail=None, path=None):
+    # Only queues the entry; the background writer commits it in a batch
+    audit.record(username, action, table, key, detail, path or db_path)
 
 # --- Delete functions ---
-def delete_single_record(table, where_clause, params):
-    conn = sqlite3.connect("hrm.db")
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-    cursor.execute(f"DELETE FROM {table} WHERE {where_clause}", params)
-    conn.commit()
-    conn.close()
+def delete_selected_records(page, table, columns):
+    # Checkbox column over the current page; selected keys go out in one batch
+    keys = list(db.TABLE_KEYS[table])
+    with metrics.timed("delete_selection"):
+        selection = page.select(columns).to_pandas()
+        selection.insert(0, "Select", False)
+        edited = st.data_editor(
+            selection,
+            hide_index=True,
+            disabled=columns,
+            use_container_width=True,
+            key=f"{table}_selection",
+        )
+    chosen = edited.loc[edited["Select"], keys]
+    if st.button(f"Delete Selected ({len(chosen)})", key=f"{table}_delete_selected", disabled=chosen.empty):
+        key_rows = list(chosen.itertuples(index=False, name=None))
+        db.delete_many(table, key_rows, db_path)
+        audit.record_many(username, "delete", table, key_rows, db_path)
+        summaries.refresh(db_path)
+        st.rerun()
 
 def delete_all_records(table):
-    conn = sqlite3.connect("hrm.db")
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-    cursor.execute(f"DELETE FROM {table}")
-    conn.commit()
-    conn.close()
+    deleted = db.execute_write(f"DELETE FROM {table}", tables=(table,), path=db_path)
+    audit_event("delete_all", table, detail={"rows": deleted})
+    summaries.refresh(db_path)
+
+# --- Leave calendar ---
+def leave_calendar_section():
+    cols = st.columns(3)
+    start = cols[0].date_input("From", key="calendar_from")
+    end = cols[1].date_input("To", key="calendar_to")
+    departments = db.read_column("SELECT department_id FROM department", path=db_path, tables=("department",))
+    department = cols[2].selectbox("Department", ["All"] + departments, key="calendar_department")
+    department = None if department == "All" else department
+    include_pending = st.checkbox("Count pending leave as out", key="calendar_pending")
+    statuses = ("Approved", "Pending") if include_pending else leave_calendar.OUT_STATUSES
+    if end < start:
+        st.warning("⚠️ 'To' is before 'From'.")
+        return
+
+    st.markdown("#### Who Is Out")
+    display_table_with_scroll(leave_calendar.who_is_out(start, end, department, statuses, db_path))
+    st.markdown("#### Department Coverage")
+    display_table_with_scroll(leave_calendar.department_coverage(start, end, department, statuses, db_path))
+    if (end - start).days >= leave_calendar.MAX_RANGE_DAYS:
+        st.caption(f"Coverage shows the first {leave_calendar.MAX_RANGE_DAYS} days of the range.")
+    st.markdown("#### Attendance Cross-Check")
+    display_table_with_scroll(leave_calendar.attendance_mismatches(start, end, db_path))
+
+# --- Session ---
+# The login token is looked up in this process's session cache on every
+# rerun; once it expires or is revoked the user is back at the login screen
+user = auth.current_user(st.session_state.get("auth_token"))
+if user is None and "auth_token" in st.session_state:
+    for key in list(st.session_state):
+        del st.session_state[key]
+    st.session_state.session_ended = True
+
+# Sidebar label -> page; each role sees the pages auth.PAGE_ROLES allows
+PAGES = [
+    ("Employee Details", "Employee Details"),
+    ("Department", "Department"),
+    ("Salary", "Salary"),
+    ("Attendance", "Attendance"),
+    ("Leave Management", "Leave Management"),
+    ("Monthly Summary", "Monthly Summary"),
+    ("Rules & Regulations", "Rules"),
+    ("Organization Totals", "Organization"),
+    ("Users", "Users"),
+    ("Audit Log", "Audit"),
+]
 
 # --- Session defaults ---
-if "stored_username" not in st.session_state:
-    st.session_state.stored_username = "AMRUTHA"
-    st.session_state.stored_password = hash_password("ABCD@123")
-if "logged_in" not in st.session_state:
-    st.session_state.logged_in = False
 if "show_forgot" not in st.session_state:
     st.session_state.show_forgot = False
 if "selected_page" not in st.session_state:
     st.session_state.selected_page = "Department"
-if "initialized" not in st.session_state:
-    initialize_database()
-    st.session_state.initialized = True
+auth.init_users()
 
 # --- Page setup ---
 st.set_page_config(page_title="HRM Login", layout="centered")
 
-# --- Marquee ---
+# --- Marquee and styling ---
+# One element: Streamlit drops anything a rerun does not send again, so this
+# goes out on every run and should stay a single small delta
 st.markdown("""
     <div style="width: 100%; overflow: hidden;">
         <marquee behavior="scroll" direction="left" scrollamount="6" style="
@@ -165,10 +302,6 @@ st.markdown("""
             HUMAN RESOURCE MANAGEMENT SYSTEM
         </marquee>
     </div>
-""", unsafe_allow_html=True)
-
-# --- Styling ---
-st.markdown("""
     <style>
     .stApp {
         background: linear-gradient(135deg, #f6d365 0%, #fda085 100%);
@@ -223,261 +356,379 @@ st.markdown("""
 
 
 # --- Logged-in UI ---
-if st.session_state.logged_in:
-    with st.sidebar:
-        st.markdown("## HRM MENU")
-        if st.button("Employee Details"):
-            st.session_state.selected_page = "Employee Details"
-        if st.button("Department"):
-            st.session_state.selected_page = "Department"
-        if st.button("Salary"):
-            st.session_state.selected_page = "Salary"
-        if st.button("Attendance"):
-            st.session_state.selected_page = "Attendance"
-        if st.button("Leave Management"):
-            st.session_state.selected_page = "Leave Management"
-        if st.button("Rules & Regulations"):
-            st.session_state.selected_page = "Rules"
-        if st.button("Logout"):
-            st.session_state.logged_in = False
-            st.rerun()
-
-    st.markdown('<div class="main-content">', unsafe_allow_html=True)
-    conn = sqlite3.connect("hrm.db")
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-
-    if st.session_state.selected_page == "Employee Details":
-        st.markdown("##  Add Employee Details")
-        cursor.execute("SELECT  department_id FROM department")
-        departments = [row[0] for row in cursor.fetchall()]
-        with st.form("employee_form"):
-            emp_id = st.text_input("Employee ID")
-            name = st.text_input("Employee Name")
-            address = st.text_area("Address")
-            dob = st.date_input("Date of Birth")
-            position = st.text_input("Position")
-            department = st.selectbox("Select Department", departments) if departments else st.text_input("Department Name")
-            submit_emp = st.form_submit_button("Add Employee")
-            if submit_emp:
-                try:
-                    cursor.execute(
-                        "INSERT INTO employee (emp_id, name, address, dob, position, department_id) VALUES (?, ?, ?, ?, ?, ?)",
-                        (emp_id, name, address, dob, position, department)
-                    )
-                    conn.commit()
-                    st.success("✅ Employee added successfully.")
-                except sqlite3.IntegrityError:
-                    st.error("❌ Employee ID already exists or invalid foreign key.")
-
-        cursor.execute("SELECT * FROM employee")
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
-        display_table_with_scroll(df)
-
-        st.markdown("### Delete Employee Record")
-        for i, row in df.iterrows():
-            cols = st.columns([5,1])
-            cols[0].write(f"ID: {row['emp_id']} | Name: {row['name']}")
-            if cols[1].button("Delete", key=f"del_emp_{row['emp_id']}"):
-                delete_single_record("employee", "emp_id = ?", (row['emp_id'],))
+if user:
+    username, role = user
+    # Every query below goes to the subsidiary's own shard, picked at login
+    db_path = st.session_state.db_path
+    initialize_database(db_path)
+    # Table pages need pandas and the modules built on it; the login screen does not
+    import pandas as pd
+    import exporter
+    import importer
+    import payroll
+
+    allowed = [(label, page) for label, page in PAGES if auth.can_view(role, page)]
+    if not auth.can_view(role, st.session_state.selected_page):
+        st.session_state.selected_page = allowed[0][1]
+
+    # Every exit from here, including st.rerun() and errors, ends the trace
+    metrics.begin_rerun(st.session_state.selected_page)
+    try:
+        with st.sidebar:
+            st.markdown("## HRM MENU")
+            st.caption(f"Company: {st.session_state.tenant_name}")
+            st.caption(f"Signed in as {username} ({role})")
+            for label, page in allowed:
+                if st.button(label):
+                    st.session_state.selected_page = page
+            if st.button("Logout"):
+                # Page state (cursors, jobs) belongs to the shard; start clean
+                auth.logout(st.session_state.auth_token)
+                for key in list(st.session_state):
+                    del st.session_state[key]
                 st.rerun()
+            if auth.can_view(role, "Debug"):
+                st.checkbox("Debug panel", key="debug_panel")
+
+        st.markdown('<div class="main-content">', unsafe_allow_html=True)
+
+        if st.session_state.selected_page == "Employee Details":
+            st.markdown("##  Add Employee Details")
+            departments = db.read_column("SELECT department_id FROM department", path=db_path, tables=("department",))
+            with st.form("employee_form"):
+                emp_id = st.text_input("Employee ID")
+                name = st.text_input("Employee Name")
+                address = st.text_area("Address")
+                dob = st.date_input("Date of Birth")
+                position = st.text_input("Position")
+                department = st.selectbox("Select Department", departments) if departments else st.text_input("Department Name")
+                submit_emp = st.form_submit_button("Add Employee")
+                if submit_emp:
+                    try:
+                        db.execute_write(
+                            "INSERT INTO employee (emp_id, name, address, dob, position, department_id) VALUES (?, ?, ?, ?, ?, ?)",
+                            (emp_id, name, address, dob, position, department),
+                            tables=("employee",), path=db_path
+                        )
+                        audit_event("insert", "employee", (emp_id,), {"name": name, "address": address, "dob": dob,
+                                                                       "position": position, "department_id": department})
+                        st.success("✅ Employee added successfully.")
+                    except sqlite3.IntegrityError:
+                        st.error("❌ Employee ID already exists or invalid foreign key.")
 
-        if st.button("Delete All Employees"):
-            delete_all_records("employee")
-            st.rerun()
+            with metrics.timed("bulk_import"):
+                bulk_import_section("employee")
 
-    elif st.session_state.selected_page == "Department":
-        st.markdown("## Add Department Details")
-        with st.form("department_form"):
-            department_id = st.text_input("Department ID")
-            department_name = st.text_input("Department Name")
-            submit_dept = st.form_submit_button("Add Department")
-            if submit_dept:
-                try:
-                    cursor.execute(
-                        "INSERT INTO department (department_id, department_name) VALUES (?, ?)",
-                        (department_id, department_name)
-                    )
-                    conn.commit()
-                    st.success("✅ Department added successfully.")
-                except sqlite3.IntegrityError:
-                    st.error("❌ Department ID already exists.")
-
-        cursor.execute("SELECT * FROM department")
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
-        display_table_with_scroll(df)
-
-        st.markdown("### Delete Department Record")
-        for i, row in df.iterrows():
-            cols = st.columns([5,1])
-            cols[0].write(f"ID: {row['department_id']} | Name: {row['department_name']}")
-            if cols[1].button("Delete", key=f"del_dept_{row['department_id']}"):
-                delete_single_record("department", "department_id = ?", (row['department_id'],))
-                st.rerun()
+            page = display_paginated_table("employee")
 
-        if st.button("Delete All Departments"):
-            delete_all_records("department")
-            st.rerun()
+            st.markdown("### Delete Employee Record")
+            delete_selected_records(page, "employee", ["emp_id", "name"])
 
-    elif st.session_state.selected_page == "Salary":
-        st.markdown("## Salary Management")
-        cursor.execute("SELECT emp_id FROM employee")
-        emp_ids = [row[0] for row in cursor.fetchall()]
-        if not emp_ids:
-            st.warning("⚠️ No employees found.")
-        else:
-            with st.form("salary_form"):
-                emp_id = st.selectbox("Select Employee ID", emp_ids)
-                amount = st.number_input("Basic Salary Amount", min_value=0)
-                total_stipend = st.number_input("Total Monthly Stipend", min_value=0)
-                amount_deducted = st.number_input("Amount Deducted", min_value=0)
-                bank_details = st.text_input("Bank Details")
-                payment_method = st.selectbox("Payment Method", ["Bank Transfer", "Cash", "UPI", "Other"])
-                payment_date = st.date_input("Payment Date")
-                submit_sal = st.form_submit_button("Add Salary Record")
-                if submit_sal:
-                    try:
-                        cursor.execute("""
-                            INSERT INTO salary (emp_id, amount, payment_date, bank_details, total_monthly_stipend, amount_deducted, payment_method)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """, (emp_id, amount, payment_date, bank_details, total_stipend, amount_deducted, payment_method))
-                        conn.commit()
-                        st.success("✅ Salary record added.")
-                    except sqlite3.IntegrityError:
-                        st.error("❌ Invalid Employee ID or duplicate payment date.")
-
-        cursor.execute("""
-            SELECT s.emp_id, e.name, s.amount, s.total_monthly_stipend, s.amount_deducted,
-                   s.bank_details, s.payment_method, s.payment_date
-            FROM salary s
-            JOIN employee e ON s.emp_id = e.emp_id
-        """)
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
-        display_table_with_scroll(df)
-
-        st.markdown("### Delete Salary Record")
-        for i, row in df.iterrows():
-            cols = st.columns([6,1])
-            cols[0].write(f"Emp ID: {row['emp_id']} | Payment Date: {row['payment_date']} | Amount: {row['amount']}")
-            if cols[1].button("Delete", key=f"del_sal_{row['emp_id']}_{row['payment_date']}"):
-                delete_single_record("salary", "emp_id = ? AND payment_date = ?", (row['emp_id'], row['payment_date']))
+            if auth.can(role, "delete_all") and st.button("Delete All Employees"):
+                delete_all_records("employee")
                 st.rerun()
 
-        if st.button("Delete All Salaries"):
-            delete_all_records("salary")
-            st.rerun()
-
-    elif st.session_state.selected_page == "Attendance":
-        st.markdown("## Attendance Management")
-        cursor.execute("SELECT emp_id FROM employee")
-        emp_ids = [row[0] for row in cursor.fetchall()]
-        if not emp_ids:
-            st.warning("⚠️ No employees found.")
-        else:
-            with st.form("attendance_form"):
-                employee_id = st.selectbox("Select Employee", emp_ids)
-                date = st.date_input("Date")
-                status = st.radio("Status", ["Present", "Absent"])
-                submit_attn = st.form_submit_button("Submit Attendance")
-                if submit_attn:
+        elif st.session_state.selected_page == "Department":
+            st.markdown("## Add Department Details")
+            with st.form("department_form"):
+                department_id = st.text_input("Department ID")
+                department_name = st.text_input("Department Name")
+                submit_dept = st.form_submit_button("Add Department")
+                if submit_dept:
                     try:
-                        cursor.execute(
-                            "INSERT INTO attendance (employee_id, date, status) VALUES (?, ?, ?)",
-                            (employee_id, date, status)
+                        db.execute_write(
+                            "INSERT INTO department (department_id, department_name) VALUES (?, ?)",
+                            (department_id, department_name),
+                            tables=("department",), path=db_path
                         )
-                        conn.commit()
-                        st.success("✅ Attendance recorded.")
+                        audit_event("insert", "department", (department_id,), {"department_name": department_name})
+                        st.success("✅ Department added successfully.")
                     except sqlite3.IntegrityError:
-                        st.error("❌ Error recording attendance.")
-
-        cursor.execute("SELECT * FROM attendance")
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
-        display_table_with_scroll(df)
-
-        st.markdown("### Delete Attendance Record")
-        for i, row in df.iterrows():
-            cols = st.columns([6,1])
-            cols[0].write(f"Emp ID: {row['employee_id']} | Date: {row['date']} | Status: {row['status']}")
-            if cols[1].button("Delete", key=f"del_attn_{row['employee_id']}_{row['date']}"):
-                delete_single_record("attendance", "employee_id = ? AND date = ?", (row['employee_id'], row['date']))
-                st.rerun()
+                        st.error("❌ Department ID already exists.")
 
-        if st.button("Delete All Attendance Records"):
-            delete_all_records("attendance")
-            st.rerun()
+            page = display_paginated_table("department")
 
-    elif st.session_state.selected_page == "Leave Management":
-        st.markdown("## Leave Management")
-        cursor.execute("SELECT emp_id FROM employee")
-        emp_ids = [row[0] for row in cursor.fetchall()]
-        if not emp_ids:
-            st.warning("⚠️ No employees found.")
-        else:
-            with st.form("leave_form"):
-                emp_id = st.selectbox("Select Employee", emp_ids)
-                leave_type = st.selectbox("Leave Type", ["Sick Leave", "Casual Leave", "Paid Leave", "Other"])
-                start_date = st.date_input("Start Date")
-                end_date = st.date_input("End Date")
-                status = st.selectbox("Status", ["Pending", "Approved", "Rejected"])
-                submit_leave = st.form_submit_button("Submit Leave")
-                if submit_leave:
-                    try:
-                        cursor.execute(
-                            "INSERT INTO leave_record (emp_id, leave_type, start_date, end_date, status) VALUES (?, ?, ?, ?, ?)",
-                            (emp_id, leave_type, start_date, end_date, status)
-                        )
-                        conn.commit()
-                        st.success("✅ Leave record added.")
-                    except sqlite3.IntegrityError:
-                        st.error("❌ Error inserting leave record.")
-
-        cursor.execute("SELECT * FROM leave_record")
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
-        display_table_with_scroll(df)
-
-        st.markdown("### Delete Leave Record")
-        for i, row in df.iterrows():
-            cols = st.columns([6,1])
-            cols[0].write(f"Emp ID: {row['emp_id']} | Leave: {row['leave_type']} | From: {row['start_date']} To: {row['end_date']}")
-            if cols[1].button("Delete", key=f"del_leave_{row['emp_id']}_{row['start_date']}_{row['end_date']}"):
-                delete_single_record("leave_record", "emp_id = ? AND start_date = ? AND end_date = ?", (row['emp_id'], row['start_date'], row['end_date']))
-                st.rerun()
+            st.markdown("### Delete Department Record")
+            delete_selected_records(page, "department", ["department_id", "department_name"])
 
-        if st.button("Delete All Leave Records"):
-            delete_all_records("leave_record")
-            st.rerun()
+            if auth.can(role, "delete_all") and st.button("Delete All Departments"):
+                delete_all_records("department")
+                st.rerun()
 
-    elif st.session_state.selected_page == "Rules":
-         st.markdown("## HRM Rules & Regulations")
+        elif st.session_state.selected_page == "Salary":
+            st.markdown("## Salary Management")
+            emp_ids = db.read_column("SELECT emp_id FROM employee", path=db_path, tables=("employee",))
+            if not emp_ids:
+                st.warning("⚠️ No employees found.")
+            else:
+                with st.form("salary_form"):
+                    emp_id = st.selectbox("Select Employee ID", emp_ids)
+                    amount = st.number_input("Basic Salary Amount", min_value=0)
+                    total_stipend = st.number_input("Total Monthly Stipend", min_value=0)
+                    amount_deducted = st.number_input("Amount Deducted", min_value=0)
+                    bank_details = st.text_input("Bank Details")
+                    payment_method = st.selectbox("Payment Method", ["Bank Transfer", "Cash", "UPI", "Other"])
+                    payment_date = st.date_input("Payment Date")
+                    submit_sal = st.form_submit_button("Add Salary Record")
+                    if submit_sal:
+                        try:
+                            db.execute_write("""
+                                INSERT INTO salary (emp_id, amount, payment_date, bank_details, total_monthly_stipend, amount_deducted, payment_method)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)
+                            """, (emp_id, amount, payment_date, bank_details, total_stipend, amount_deducted, payment_method), tables=("salary",), path=db_path)
+                            # Bank details stay out of the audit trail
+                            audit_event("insert", "salary", (emp_id, payment_date), {
+                                "amount": amount, "total_monthly_stipend": total_stipend,
+                                "amount_deducted": amount_deducted, "payment_method": payment_method,
+                            })
+                            summaries.refresh(db_path)
+                            st.success("✅ Salary record added.")
+                        except sqlite3.IntegrityError:
+                            st.error("❌ Invalid Employee ID or duplicate payment date.")
+
+            with metrics.timed("bulk_import"):
+                bulk_import_section("salary")
+
+            with st.expander("Run Payroll"):
+                st.caption("Computes deductions for absences not covered by approved leave, and net pay, for every employee.")
+                run_date = st.date_input("Payroll Month (any day in the month)", key="payroll_month")
+                month = run_date.strftime("%Y-%m")
+                if st.button("Run Payroll", key="run_payroll"):
+                    st.session_state.payroll_job = jobs.submit("payroll", {"month": month}, path=db_path)
+                    audit_event("payroll", "payroll_run", (month,), {"job": st.session_state.payroll_job})
+                job = job_status("payroll_job")
+                if job and job["status"] == "done":
+                    st.success(f"✅ Payroll for {job['params']['month']} computed for {job['result']['employees']} employees.")
+                columns, rows = payroll.payroll_totals(month, db_path)
+                if rows and rows[0][0]:
+                    display_table_with_scroll(pd.DataFrame(rows, columns=columns))
+                    display_table_with_scroll(db.read_arrow(
+                        "SELECT * FROM payroll_run WHERE month = ? ORDER BY emp_id", (month,), db_path, ("payroll_run",)
+                    ))
+
+            page = display_paginated_table("salary")
+
+            st.markdown("### Delete Salary Record")
+            delete_selected_records(page, "salary", ["emp_id", "payment_date", "amount"])
+
+            if auth.can(role, "delete_all") and st.button("Delete All Salaries"):
+                delete_all_records("salary")
+                st.rerun()
 
-         cursor.execute("SELECT rule_title, rule_description FROM rules")
-         rules = cursor.fetchall()
+        elif st.session_state.selected_page == "Attendance":
+            st.markdown("## Attendance Management")
+            emp_ids = db.read_column("SELECT emp_id FROM employee", path=db_path, tables=("employee",))
+            if not emp_ids:
+                st.warning("⚠️ No employees found.")
+            else:
+                with st.form("attendance_form"):
+                    employee_id = st.selectbox("Select Employee", emp_ids)
+                    date = st.date_input("Date")
+                    status = st.radio("Status", ["Present", "Absent"])
+                    submit_attn = st.form_submit_button("Submit Attendance")
+                    if submit_attn:
+                        try:
+                            db.execute_write(
+                                "INSERT INTO attendance (employee_id, date, status) VALUES (?, ?, ?)",
+                                (employee_id, date, status),
+                                tables=("attendance",), path=db_path
+                            )
+                            audit_event("insert", "attendance", (employee_id, date), {"status": status})
+                            summaries.refresh(db_path)
+                            st.success("✅ Attendance recorded.")
+                        except sqlite3.IntegrityError:
+                            st.error("❌ Error recording attendance.")
+
+            with metrics.timed("bulk_import"):
+                bulk_import_section("attendance")
+
+            page = display_paginated_table("attendance")
+
+            st.markdown("### Delete Attendance Record")
+            delete_selected_records(page, "attendance", ["employee_id", "date", "status"])
+
+            if auth.can(role, "delete_all") and st.button("Delete All Attendance Records"):
+                delete_all_records("attendance")
+                st.rerun()
 
-         if rules:
-            for i, (title, description) in enumerate(rules, 1):
-                st.markdown(f"**{i}. {title}**\n\n- {description}\n")
-         else:
-            st.info("No rules found.")
+        elif st.session_state.selected_page == "Leave Management":
+            st.markdown("## Leave Management")
+            emp_ids = db.read_column("SELECT emp_id FROM employee", path=db_path, tables=("employee",))
+            if not emp_ids:
+                st.warning("⚠️ No employees found.")
+            else:
+                with st.form("leave_form"):
+                    emp_id = st.selectbox("Select Employee", emp_ids)
+                    leave_type = st.selectbox("Leave Type", ["Sick Leave", "Casual Leave", "Paid Leave", "Other"])
+                    start_date = st.date_input("Start Date")
+                    end_date = st.date_input("End Date")
+                    status = st.selectbox("Status", ["Pending", "Approved", "Rejected"])
+                    submit_leave = st.form_submit_button("Submit Leave")
+                    if submit_leave:
+                        try:
+                            db.execute_write(
+                                "INSERT INTO leave_record (emp_id, leave_type, start_date, end_date, status) VALUES (?, ?, ?, ?, ?)",
+                                (emp_id, leave_type, start_date, end_date, status),
+                                tables=("leave_record",), path=db_path
+                            )
+                            audit_event("insert", "leave_record", (emp_id, start_date, end_date),
+                                        {"leave_type": leave_type, "status": status})
+                            st.success("✅ Leave record added.")
+                        except sqlite3.IntegrityError as e:
+                            if "overlapping leave" in str(e):
+                                st.error("❌ This leave overlaps an existing leave for the employee.")
+                                columns, rows = leave_calendar.conflicts(emp_id, start_date, end_date, db_path)
+                                display_table_with_scroll(pd.DataFrame(rows, columns=columns))
+                            elif "ends before it starts" in str(e):
+                                st.error("❌ End date is before the start date.")
+                            else:
+                                st.error("❌ Error inserting leave record.")
+
+            with st.expander("Leave Calendar"):
+                with metrics.timed("leave_calendar"):
+                    leave_calendar_section()
+
+            page = display_paginated_table("leave_record")
+
+            st.markdown("### Delete Leave Record")
+            delete_selected_records(page, "leave_record", ["emp_id", "leave_type", "start_date", "end_date"])
+
+            if auth.can(role, "delete_all") and st.button("Delete All Leave Records"):
+                delete_all_records("leave_record")
+                st.rerun()
 
-         conn.close()
+        elif st.session_state.selected_page == "Monthly Summary":
+            st.markdown("## Monthly Attendance & Payroll Summary")
+            summaries.refresh(db_path)
+            months = summaries.months(db_path)
+            if not months:
+                st.info("No attendance or salary records yet.")
+            else:
+                month = st.selectbox("Month", months)
+                # Managers see attendance only; pay stays with the roles that see Salary
+                hide_pay = not auth.can(role, "view_pay")
+                st.markdown("### By Department")
+                by_department = summaries.department_summary(month, db_path)
+                display_table_with_scroll(summaries.without_pay(by_department) if hide_pay else by_department)
+
+                st.markdown("### By Employee")
+                departments = db.read_column("SELECT department_id FROM department", path=db_path, tables=("department",))
+                department = st.selectbox("Department", ["All"] + departments)
+                by_employee = summaries.employee_summary(month, None if department == "All" else department, db_path)
+                display_table_with_scroll(summaries.without_pay(by_employee) if hide_pay else by_employee)
+                st.caption(
+                    f"Attendance below {summaries.ATTENDANCE_TARGET_PCT}% or an absence streak of "
+                    f"{summaries.ABSENCE_STREAK_LIMIT}+ days breaks the Attendance Policy."
+                )
+
+            if auth.can(role, "rebuild_summaries") and st.button("Rebuild Summaries"):
+                summaries.rebuild(db_path)
+                st.rerun()
 
+        elif st.session_state.selected_page == "Organization":
+            st.markdown("## Organization Totals")
+            st.caption("Read-only headcount and payroll totals across every subsidiary's database.")
+            run_date = st.date_input("Payroll Month (any day in the month)", key="org_month")
+            with metrics.timed("org_totals"):
+                totals = tenants.org_totals(run_date.strftime("%Y-%m"))
+            display_table_with_scroll(totals)
+            if totals["error"].notna().any():
+                st.warning("⚠️ Some subsidiaries could not be read; see the error column.")
+
+        elif st.session_state.selected_page == "Users":
+            st.markdown("## Users")
+            st.caption("Logins are shared by all subsidiaries; each user works in the company they are assigned to.")
+            columns, rows = auth.users()
+            display_table_with_scroll(pd.DataFrame(rows, columns=columns))
+
+            companies = {tenant_id: name for tenant_id, name, _ in tenants.tenants()}
+            with st.form("user_form", clear_on_submit=True):
+                st.markdown("### Add User")
+                new_user = st.text_input("Username")
+                new_pass = st.text_input("Temporary Password", type="password")
+                new_role = st.selectbox("Role", auth.ROLES)
+                company = st.selectbox("Company", list(companies), format_func=companies.get)
+                if st.form_submit_button("Add User"):
+                    if not new_user.strip() or len(new_pass) < auth.MIN_PASSWORD_LENGTH:
+                        st.warning(f"Enter a username and a password of at least {auth.MIN_PASSWORD_LENGTH} characters.")
+                    else:
+                        try:
+                            auth.add_user(new_user, new_pass, new_role, must_change=True)
+                            tenants.assign_user(new_user.strip().upper(), company)
+                            audit_event("insert", "users", (new_user.strip().upper(),),
+                                        {"role": new_role, "tenant_id": company}, tenants.DIRECTORY_PATH)
+                            st.success(f"✅ Added {new_user.strip().upper()}; they choose their own password at first login.")
+                        except sqlite3.IntegrityError:
+                            st.error("❌ That username already exists.")
+
+            st.markdown("### Change Role or Password")
+            names = [row[0] for row in rows]
+            target = st.selectbox("User", names, key="users_target")
+            cols = st.columns(2)
+            target_role = cols[0].selectbox("Role", auth.ROLES, key="users_role")
+            if cols[0].button("Set Role", disabled=target == username):
+                auth.set_role(target, target_role)
+                audit_event("set_role", "users", (target,), {"role": target_role}, tenants.DIRECTORY_PATH)
+                st.rerun()
+            temp_pass = cols[1].text_input("Temporary Password", type="password", key="users_password")
+            if cols[1].button("Reset Password", disabled=len(temp_pass) < auth.MIN_PASSWORD_LENGTH):
+                auth.set_password(target, temp_pass, must_change=True)
+                audit_event("reset_password", "users", (target,), path=tenants.DIRECTORY_PATH)
+                st.success(f"✅ {target} must choose a new password at next login.")
+            if st.button("Remove User", disabled=target == username):
+                auth.remove_user(target)
+                audit_event("delete", "users", (target,), path=tenants.DIRECTORY_PATH)
+                st.rerun()
+            st.caption("Changes end the user's sessions on this server at once and reach other "
+                       f"servers within {auth.RECHECK_SECONDS} seconds.")
+
+        elif st.session_state.selected_page == "Audit":
+            st.markdown("## Audit Log")
+            source = st.radio("Log", ["Company data", "User accounts"], horizontal=True, key="audit_source")
+            audit_path = db_path if source == "Company data" else tenants.DIRECTORY_PATH
+            tables = list(db.TABLE_KEYS) + ["payroll_run", "rules"] if source == "Company data" else ["users"]
+            cols = st.columns(4)
+            table = cols[0].selectbox("Table", ["All"] + tables, key="audit_table")
+            record_id = cols[1].text_input("Record ID", key="audit_record")
+            start = cols[2].date_input("From", value=None, key="audit_from")
+            end = cols[3].date_input("To", value=None, key="audit_to")
+            actor = st.text_input("Changed by", key="audit_user")
+            # Entries still queued for the writer would be missing otherwise
+            audit.flush(audit_path, 5 * audit.FLUSH_SECONDS)
+            with metrics.timed("audit_history"):
+                entries = audit.history(None if table == "All" else table, record_id.strip(), start, end, actor, path=audit_path)
+            display_table_with_scroll(entries)
+            st.caption(
+                f"Newest {audit.HISTORY_LIMIT} matching entries; times are UTC. Record ID is the first part of the key "
+                f"(the employee ID for salary, attendance and leave). After {audit.COMPACT_DAYS} days only daily counts "
+                f"are kept, and after {audit.RETENTION_DAYS} days entries are deleted."
+            )
+            if st.button("Compact Now"):
+                days, deleted = audit.compact(audit_path)
+                st.success(f"✅ Compacted {days} day(s) and deleted {deleted} expired entries.")
+
+        elif st.session_state.selected_page == "Rules":
+             st.markdown("## HRM Rules & Regulations")
+
+             _, rules = db.read_query("SELECT rule_title, rule_description FROM rules", path=db_path, tables=("rules",))
+
+             if rules:
+                for i, (title, description) in enumerate(rules, 1):
+                    st.markdown(f"**{i}. {title}**\n\n- {description}\n")
+             else:
+                st.info("No rules found.")
+
+
+             if auth.can(role, "delete_all") and st.button("Delete All Rules"):
+                delete_all_records("rules")
+                st.rerun()
 
-         if st.button("Delete All Rules"):
-            delete_all_records("rules")
-            st.rerun()
+        st.markdown('</div>', unsafe_allow_html=True)
 
-    conn.close()
-    st.markdown('</div>', unsafe_allow_html=True)
+        if auth.can_view(role, "Debug") and st.session_state.get("debug_panel"):
+            render_debug_panel()
+    finally:
+        metrics.end_rerun()
 
 else:
     # --- Login UI ---
@@ -485,30 +736,62 @@ else:
    # st.markdown('<img src="https://cdn-icons-png.flaticon.com/512/149/149071.png" class="user-icon">', unsafe_allow_html=True)
     st.markdown('<div class="login-title">User Login</div>', unsafe_allow_html=True)
 
+    if st.session_state.pop("session_ended", False):
+        st.info("Your session has ended. Please log in again.")
+
     if not st.session_state.show_forgot:
         username = st.text_input("Username", placeholder="Username", key="login_user")
         password = st.text_input("Password", placeholder="Password", type="password", key="login_pass")
         if st.button("Log In"):
-            if username.strip().upper() == st.session_state.stored_username and hash_password(password) == st.session_state.stored_password:
-                st.session_state.logged_in = True
+            account = auth.authenticate(username, password)
+            if account is None:
+                st.error("❌ Invalid username or password.")
+            elif account[1]:
+                # New accounts and admin resets must pick their own password first
+                st.session_state.show_forgot = True
+                st.session_state.must_change = True
                 st.rerun()
             else:
-                st.error("❌ Invalid username or password.")
-        st.markdown('<a class="forgot-link" href="#">Forgot Password?</a>', unsafe_allow_html=True)
-        if st.button("Click here to reset password"):
+                tenant_id, tenant_name, tenant_path = tenants.tenant_for(account[0][0])
+                st.session_state.tenant_id = tenant_id
+                st.session_state.tenant_name = tenant_name
+                st.session_state.db_path = tenant_path
+                st.session_state.auth_token = auth.login(account[0])
+                st.rerun()
+        st.markdown('<a class="forgot-link" href="#">Forgot Password? Ask an administrator to reset it.</a>', unsafe_allow_html=True)
+        if st.button("Click here to change password"):
             st.session_state.show_forgot = True
+            st.rerun()
     else:
-        st.markdown("### 🔐 Reset Your Credentials", unsafe_allow_html=True)
-        new_user = st.text_input("New Username")
+        st.markdown("### 🔐 Change Your Password", unsafe_allow_html=True)
+        if st.session_state.get("must_change"):
+            st.warning("Your password must be changed before you can log in.")
+        change_user = st.text_input("Username", key="change_user")
+        current_pass = st.text_input("Current Password", type="password")
         new_pass = st.text_input("New Password", type="password")
         confirm_pass = st.text_input("Confirm Password", type="password")
-        if st.button("Reset Now"):
+        if st.button("Change Now"):
             if new_pass != confirm_pass:
                 st.error("❗ Passwords do not match.")
-            elif new_user.strip() == "" or new_pass.strip() == "":
+            elif change_user.strip() == "" or current_pass == "" or new_pass.strip() == "":
                 st.warning("Please fill all fields.")
+            elif len(new_pass) < auth.MIN_PASSWORD_LENGTH:
+                st.warning(f"Passwords need at least {auth.MIN_PASSWORD_LENGTH} characters.")
+            elif new_pass == current_pass:
+                st.warning("Choose a password different from the current one.")
+            elif auth.authenticate(change_user, current_pass) is None:
+                st.error("❌ Invalid username or password.")
             else:
-                st.session_state.stored_username = new_user.strip().upper()
-                st.session_state.stored_password = hash_password(new_pass)
-                st.success("✅ Username & password updated!")
+                auth.set_password(change_user, new_pass)
+                st.success("✅ Password updated! You can log in now.")
                 st.session_state.show_forgot = False
+                st.session_state.must_change = False
+        if st.button("Back to login"):
+            st.session_state.show_forgot = False
+            st.session_state.must_change = False
+            st.rerun()
+
+    # Time-to-first-paint of the login screen, once per session
+    if not st.session_state.get("login_painted"):
+        st.session_state.login_painted = True
+        metrics.record_first_paint("login", time.perf_counter() - SCRIPT_START)
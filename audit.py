@@ -0,0 +1,206 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+import streamlit as st
+
+import db
+
+# Entries are queued in memory and written by one background thread per
+# database: whatever arrives within FLUSH_SECONDS of the first entry, up to
+# FLUSH_ROWS, goes in one transaction. A crash loses at most that window.
+FLUSH_SECONDS = 0.5
+FLUSH_ROWS = 1000
+RETRY_SECONDS = 2.0
+# A full queue makes record() wait rather than drop entries
+MAX_QUEUED = 100_000
+# Entries older than COMPACT_DAYS are folded into per-day counts; older than
+# RETENTION_DAYS they are deleted
+COMPACT_DAYS = int(os.environ.get("HRM_AUDIT_COMPACT_DAYS", "90"))
+RETENTION_DAYS = int(os.environ.get("HRM_AUDIT_RETENTION_DAYS", "730"))
+DELETE_BATCH = 10_000
+COMPACT_PAUSE = 0.05
+HISTORY_LIMIT = 1000
+
+INSERT_SQL = """
+    INSERT INTO audit_log (logged_at, username, action, table_name, record_id, row_key, detail)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+# --- Writer ---
+class AuditWriter:
+    def __init__(self, path):
+        self.pool = db.get_pool(path)
+        self._queue = queue.Queue(MAX_QUEUED)
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="hrm-audit", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, 5 * FLUSH_SECONDS)
+
+    def record(self, entry):
+        with self._idle:
+            self._pending += 1
+        self._queue.put(entry)
+
+    def flush(self, timeout=None):
+        # Waits until everything recorded so far is committed; False on timeout
+        with self._idle:
+            if self._pending == 0:
+                return True
+        self._queue.put(None)  # ends the current batch without waiting out FLUSH_SECONDS
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _take(self):
+        batch = []
+        entry = self._queue.get()
+        deadline = time.monotonic() + FLUSH_SECONDS
+        while entry is not None:
+            batch.append(entry)
+            if len(batch) >= FLUSH_ROWS:
+                break
+            try:
+                entry = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                continue
+            while True:
+                try:
+                    with self.pool.writer() as conn:
+                        conn.executemany(INSERT_SQL, batch)
+                    break
+                except Exception:
+                    # Keep the batch and try again; entries are never dropped
+                    traceback.print_exc()
+                    time.sleep(RETRY_SECONDS)
+            self.pool.bump(("audit_log",))
+            with self._idle:
+                self._pending -= len(batch)
+                if self._pending == 0:
+                    self._idle.notify_all()
+
+
+@st.cache_resource
+def get_writer(path=db.DB_PATH):
+    return AuditWriter(path)
+
+
+def _entry(logged_at, username, action, table, key, detail):
+    key = [db.sql_value(value) for value in key]
+    return (
+        logged_at, username, action, table,
+        str(key[0]) if key else None,
+        json.dumps(key) if key else None,
+        json.dumps(detail, default=str) if detail is not None else None,
+    )
+
+
+def record(username, action, table, key=(), detail=None, path=db.DB_PATH):
+    # Queues one entry and returns; the time is taken now, not when it is written.
+    # key is the row's primary key (db.TABLE_KEYS order); its first part is
+    # what history() looks records up by.
+    logged_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    get_writer(path).record(_entry(logged_at, username, action, table, key, detail))
+
+
+def record_many(username, action, table, keys, path=db.DB_PATH):
+    # One entry per key, e.g. for a batch delete
+    writer = get_writer(path)
+    logged_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    for key in keys:
+        writer.record(_entry(logged_at, username, action, table, key, None))
+
+
+def flush(path=db.DB_PATH, timeout=None):
+    return get_writer(path).flush(timeout)
+
+
+# --- Queries ---
+def history(table=None, record_id=None, start_date=None, end_date=None, username=None,
+            limit=HISTORY_LIMIT, path=db.DB_PATH):
+    # Newest first; dates are whole UTC days, both inclusive
+    where, params = [], []
+    if table:
+        where.append("table_name = ?")
+        params.append(table)
+    if record_id:
+        where.append("record_id = ?")
+        params.append(record_id)
+    if username:
+        where.append("username = ?")
+        params.append(username.strip().upper())
+    if start_date:
+        where.append("logged_at >= ?")
+        params.append(db.sql_value(start_date))
+    if end_date:
+        where.append("logged_at < date(?, '+1 day')")
+        params.append(db.sql_value(end_date))
+    select = ("SELECT id, logged_at, username, action, table_name, record_id, row_key, detail, entries "
+              "FROM audit_log")
+    return db.read_arrow(
+        f"{db.filtered_sql(select, where)} ORDER BY logged_at DESC, id DESC LIMIT ?",
+        params + [limit], path, ("audit_log",),
+    )
+
+
+# --- Retention ---
+def compact(path=db.DB_PATH, compact_days=COMPACT_DAYS, retention_days=RETENTION_DAYS):
+    # Folds each old day into one row per (user, action, table), a day per
+    # transaction, then deletes past retention in batches. Returns (days
+    # compacted, rows deleted).
+    flush(path)
+    pool = db.get_pool(path)
+    with pool.reader() as conn:
+        days = [row[0] for row in conn.execute(
+            "SELECT DISTINCT date(logged_at) FROM audit_log WHERE logged_at < date('now', ?) AND compacted = 0",
+            (f"-{compact_days} days",),
+        )]
+    for day in days:
+        with pool.writer() as conn:
+            window = (day, day)
+            conn.execute("""
+                INSERT INTO audit_log (logged_at, username, action, table_name, entries, compacted)
+                SELECT ?, username, action, table_name, SUM(entries), 1 FROM audit_log
+                WHERE logged_at >= ? AND logged_at < date(?, '+1 day') AND compacted = 0
+                GROUP BY username, action, table_name
+            """, (day,) + window)
+            conn.execute(
+                "DELETE FROM audit_log WHERE logged_at >= ? AND logged_at < date(?, '+1 day') AND compacted = 0",
+                window,
+            )
+        time.sleep(COMPACT_PAUSE)
+    deleted = 0
+    while True:
+        with pool.writer() as conn:
+            removed = conn.execute(
+                "DELETE FROM audit_log WHERE id IN "
+                "(SELECT id FROM audit_log WHERE logged_at < date('now', ?) LIMIT ?)",
+                (f"-{retention_days} days", DELETE_BATCH),
+            ).rowcount
+        deleted += removed
+        if removed < DELETE_BATCH:
+            break
+        time.sleep(COMPACT_PAUSE)
+    pool.bump(("audit_log",))
+    return len(days), deleted
+
+
+if __name__ == "__main__":
+    # python audit.py compact [db path]
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        sys.exit("usage: python audit.py compact [db path]")
+    days, deleted = compact(sys.argv[2] if len(sys.argv) > 2 else db.DB_PATH)
+    print(f"Compacted {days} day(s), deleted {deleted} expired entries.")
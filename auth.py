@@ -0,0 +1,324 @@
+import base64
+import functools
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from getpass import getpass
+
+import streamlit as st
+
+import db
+import tenants
+
+logger = logging.getLogger("hrm.auth")
+
+# scrypt cost. Each hash records its own parameters, so raising these only
+# affects new hashes; older ones are upgraded at their next login.
+SCRYPT_N = int(os.environ.get("HRM_SCRYPT_N", str(2 ** 15)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+# At most this many hashes are computed at once; extra logins wait their turn
+# rather than all competing for CPU and memory
+KDF_SLOTS = int(os.environ.get("HRM_KDF_SLOTS", str(os.cpu_count() or 2)))
+# Validated sessions are kept this many idle seconds, up to MAX_SESSIONS per
+# process. Each is re-checked against its users row (no KDF) every
+# RECHECK_SECONDS, so changes made elsewhere reach live sessions.
+SESSION_TTL = int(os.environ.get("HRM_SESSION_TTL", str(8 * 60 * 60)))
+MAX_SESSIONS = int(os.environ.get("HRM_MAX_SESSIONS", "10000"))
+RECHECK_SECONDS = 60
+MIN_PASSWORD_LENGTH = 8
+
+# The first admin of an empty directory. Without HRM_ADMIN_PASSWORD it gets
+# a random one-time password, logged once to the server console, and has to
+# change it at first login.
+BOOTSTRAP_USER = os.environ.get("HRM_ADMIN_USER", "AMRUTHA")
+BOOTSTRAP_PASSWORD = os.environ.get("HRM_ADMIN_PASSWORD")
+
+ROLES = ("admin", "hr", "manager")
+# Pages (selected_page values) each role may open; "Debug" is the debug panel
+PAGE_ROLES = {
+    "Employee Details": ("admin", "hr"),
+    "Department": ("admin", "hr"),
+    "Salary": ("admin", "hr"),
+    "Attendance": ("admin", "hr"),
+    "Leave Management": ("admin", "hr", "manager"),
+    "Monthly Summary": ("admin", "hr", "manager"),
+    "Rules": ("admin", "hr", "manager"),
+    "Organization": ("admin",),
+    "Users": ("admin",),
+    "Audit": ("admin",),
+    "Debug": ("admin",),
+}
+# Actions inside a page that not every role seeing the page may take
+ACTION_ROLES = {
+    "view_pay": ("admin", "hr"),  # pay columns outside the Salary page
+    "delete_all": ("admin", "hr"),
+    "rebuild_summaries": ("admin", "hr"),
+}
+
+_kdf_slots = threading.BoundedSemaphore(KDF_SLOTS)
+
+
+# --- Password hashing ---
+# Stored as scrypt$n$r$p$salt$hash, salt and hash base64-encoded
+def _scrypt(password, salt, n, r, p):
+    with _kdf_slots:
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p, dklen=32, maxmem=256 * n * r * p + (1 << 20),
+        )
+
+
+def hash_password(password):
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    encoded = (base64.b64encode(part).decode() for part in (salt, digest))
+    return "$".join(["scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P), *encoded])
+
+
+def verify_password(password, stored):
+    try:
+        kdf, n, r, p, salt, digest = stored.split("$")
+        if kdf != "scrypt":
+            return False
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored):
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+@functools.cache
+def _dummy_hash():
+    # Unknown usernames are checked against this, so they take as long to
+    # reject as a wrong password
+    return hash_password(secrets.token_hex(16))
+
+
+# --- Users ---
+# Usernames are stored upper-case, as the login form always compared them
+def _check_role(role):
+    if role not in ROLES:
+        raise ValueError(f"Unknown role: {role} (expected one of {', '.join(ROLES)})")
+
+
+@st.cache_resource
+def init_users(directory=tenants.DIRECTORY_PATH):
+    tenants.init_directory(directory)
+    one_time = None
+    with db.get_pool(directory).writer() as conn:
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            one_time = None if BOOTSTRAP_PASSWORD else secrets.token_urlsafe(12)
+            conn.execute(
+                "INSERT INTO users (username, password_hash, role, must_change) VALUES (?, ?, 'admin', ?)",
+                (BOOTSTRAP_USER.upper(), hash_password(BOOTSTRAP_PASSWORD or one_time), int(one_time is not None)),
+            )
+    if one_time:
+        logger.warning("Created admin %s with one-time password %s; it must be changed at first login. "
+                       "Set HRM_ADMIN_PASSWORD to choose it instead.", BOOTSTRAP_USER.upper(), one_time)
+    return True
+
+
+def users(directory=tenants.DIRECTORY_PATH):
+    # Uncached, like the rest of the directory
+    return db.read_query("""
+        SELECT u.username, u.role, COALESCE(t.tenant_id, ?) AS tenant_id, u.must_change,
+               u.created_at, u.password_changed_at
+        FROM users u LEFT JOIN tenant_users t ON t.username = u.username
+        ORDER BY u.username
+    """, (tenants.DEFAULT_TENANT,), directory)
+
+
+def add_user(username, password, role, must_change=False, directory=tenants.DIRECTORY_PATH):
+    _check_role(role)
+    db.execute_write(
+        "INSERT INTO users (username, password_hash, role, must_change) VALUES (?, ?, ?, ?)",
+        (username.strip().upper(), hash_password(password), role, int(must_change)), ("users",), directory,
+    )
+
+
+def set_password(username, password, must_change=False, directory=tenants.DIRECTORY_PATH):
+    db.execute_write(
+        "UPDATE users SET password_hash = ?, must_change = ?, password_changed_at = CURRENT_TIMESTAMP "
+        "WHERE username = ?", (hash_password(password), int(must_change), username.strip().upper()),
+        ("users",), directory,
+    )
+    get_sessions().revoke_user(username.strip().upper())
+
+
+def set_role(username, role, directory=tenants.DIRECTORY_PATH):
+    _check_role(role)
+    db.execute_write(
+        "UPDATE users SET role = ? WHERE username = ?", (role, username.strip().upper()), ("users",), directory,
+    )
+    get_sessions().revoke_user(username.strip().upper())
+
+
+def remove_user(username, directory=tenants.DIRECTORY_PATH):
+    username = username.strip().upper()
+    pool = db.get_pool(directory)
+    with pool.writer() as conn:
+        conn.execute("DELETE FROM users WHERE username = ?", (username,))
+        conn.execute("DELETE FROM tenant_users WHERE username = ?", (username,))
+    pool.bump(("users", "tenant_users"))
+    get_sessions().revoke_user(username)
+
+
+def authenticate(username, password, directory=tenants.DIRECTORY_PATH):
+    # ((username, role, password_changed_at), must_change), or None. The only
+    # place the KDF runs besides setting a password.
+    username = username.strip().upper()
+    _, rows = db.read_query(
+        "SELECT password_hash, role, must_change, password_changed_at FROM users WHERE username = ?",
+        (username,), directory,
+    )
+    if not rows:
+        verify_password(password, _dummy_hash())
+        return None
+    stored, role, must_change, changed_at = rows[0]
+    if not verify_password(password, stored):
+        return None
+    if needs_rehash(stored):
+        db.execute_write(
+            "UPDATE users SET password_hash = ? WHERE username = ? AND password_hash = ?",
+            (hash_password(password), username, stored), ("users",), directory,
+        )
+    return (username, role, changed_at), bool(must_change)
+
+
+def can_view(role, page):
+    return role in PAGE_ROLES.get(page, ())
+
+
+def can(role, action):
+    return role in ACTION_ROLES.get(action, ())
+
+
+# --- Sessions ---
+# Logins trade the password for a random token. Later reruns only look the
+# token up here, so the KDF never runs again for the session.
+class SessionCache:
+    def __init__(self, ttl=SESSION_TTL, capacity=MAX_SESSIONS):
+        self.ttl = ttl
+        self.capacity = capacity
+        # token -> (user, expiry, last checked), least recently used first.
+        # The TTL slides on every use, so the oldest entries also expire first.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._entries:
+            _, expires, _ = next(iter(self._entries.values()))
+            if expires > now and len(self._entries) <= self.capacity:
+                break
+            self._entries.popitem(last=False)
+
+    def issue(self, user):
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[token] = (user, now + self.ttl, now)
+            self._evict(now)
+        return token
+
+    def get(self, token):
+        # (user, last checked), or None once expired or evicted
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires, checked = entry
+            if expires <= now:
+                del self._entries[token]
+                return None
+            self._entries[token] = (user, now + self.ttl, checked)
+            self._entries.move_to_end(token)
+        return user, checked
+
+    def update(self, token, user):
+        now = time.monotonic()
+        with self._lock:
+            if token in self._entries:
+                self._entries[token] = (user, now + self.ttl, now)
+
+    def revoke(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def revoke_user(self, username):
+        with self._lock:
+            for token in [t for t, (user, _, _) in self._entries.items() if user[0] == username]:
+                del self._entries[token]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource
+def get_sessions():
+    return SessionCache()
+
+
+def login(user):
+    return get_sessions().issue(user)
+
+
+def current_user(token, directory=tenants.DIRECTORY_PATH):
+    # (username, role) behind a session token, or None. Changes made in this
+    # process end the user's sessions at once; ones made from the CLI or
+    # another process are picked up here within RECHECK_SECONDS.
+    sessions = get_sessions()
+    entry = sessions.get(token) if token else None
+    if entry is None:
+        return None
+    (username, role, changed_at), checked = entry
+    if time.monotonic() - checked >= RECHECK_SECONDS:
+        _, rows = db.read_query(
+            "SELECT role, password_changed_at FROM users WHERE username = ?", (username,), directory,
+        )
+        if not rows or rows[0][1] != changed_at:
+            sessions.revoke(token)
+            return None
+        role = rows[0][0]
+        sessions.update(token, (username, role, changed_at))
+    return username, role
+
+
+def logout(token):
+    get_sessions().revoke(token)
+
+
+if __name__ == "__main__":
+    # python auth.py add <username> <role> | passwd <username> | role <username> <role> | remove <username> | list
+    args = sys.argv[1:]
+    init_users()
+    if len(args) == 3 and args[0] == "add":
+        add_user(args[1], getpass("Password: "), args[2], must_change=True)
+        print(f"Added {args[1].upper()} ({args[2]}); they set their own password at first login.")
+    elif len(args) == 2 and args[0] == "passwd":
+        set_password(args[1], getpass("Password: "), must_change=True)
+        print(f"Reset the password of {args[1].upper()}.")
+    elif len(args) == 3 and args[0] == "role":
+        set_role(args[1], args[2])
+        print(f"{args[1].upper()} is now {args[2]}.")
+    elif len(args) == 2 and args[0] == "remove":
+        remove_user(args[1])
+        print(f"Removed {args[1].upper()}.")
+    elif args == ["list"]:
+        _, rows = users()
+        for username, role, tenant_id, must_change, _, changed in rows:
+            print(f"{username:20s} {role:8s} {tenant_id:12s} {'must change' if must_change else changed}")
+    else:
+        sys.exit("usage: python auth.py add <username> <role> | passwd <username> | role <username> <role>"
+                 " | remove <username> | list")
@@ -0,0 +1,381 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import streamlit as st
+import streamlit.config
+import streamlit.logger
+
+# Everything here runs in bare mode, which logs "no runtime", missing
+# ScriptRunContext and deprecation warnings on nearly every call, starting with
+# db's cached readers at import. Streamlit resets its log level when it first
+# reads its config, so read it before silencing them; keep above the imports.
+streamlit.config.get_option("logger.level")
+streamlit.logger.set_log_level("error")
+
+import audit
+import db
+import importer
+import leave_calendar
+import migrations
+import payroll
+import summaries
+from display import display_table_with_scroll
+
+# name -> (employees, days of attendance history)
+SCALES = {
+    "1k": (1_000, 365),
+    "100k": (100_000, 60),
+    "1m": (1_000_000, 5),
+}
+DEPARTMENTS = 20
+START_DATE = datetime.date(2024, 1, 1)
+BATCH = 50_000
+
+
+# --- Synthetic data ---
+def _batched(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _working_days(days):
+    day, found = START_DATE, []
+    while len(found) < days:
+        if day.weekday() < 5:
+            found.append(day.isoformat())
+        day += datetime.timedelta(days=1)
+    return found
+
+
+def generate(path, employees, days, seed=42):
+    # Migrates a scratch database like a real one, then bulk-loads it outside the pool
+    rng = random.Random(seed)
+    migrations.migrate(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF;")
+    emp_ids = [f"E{i:07d}" for i in range(employees)]
+    dates = _working_days(days)
+    months = sorted({d[:7] for d in dates})
+
+    def load(sql, rows):
+        for batch in _batched(rows):
+            conn.executemany(sql, batch)
+            conn.commit()
+
+    load("INSERT INTO department VALUES (?, ?)",
+         ((f"D{i:02d}", f"Department {i}") for i in range(DEPARTMENTS)))
+    load("INSERT INTO employee VALUES (?, ?, ?, ?, ?, ?)",
+         ((e, f"Employee {e}", "Address", "1990-01-01", "Staff", f"D{i % DEPARTMENTS:02d}")
+          for i, e in enumerate(emp_ids)))
+    load("INSERT INTO salary VALUES (?, ?, ?, ?, ?, ?, ?)",
+         ((e, 30000, f"{m}-01", "Bank", 32000, 0, "Bank Transfer") for m in months for e in emp_ids))
+    load("INSERT INTO attendance VALUES (?, ?, ?)",
+         ((e, d, "Absent" if rng.random() < 0.05 else "Present") for e in emp_ids for d in dates))
+    load("INSERT INTO leave_record VALUES (?, ?, ?, ?, ?)",
+         ((e, "Sick Leave", dates[0], dates[min(2, len(dates) - 1)], rng.choice(["Approved", "Pending"]))
+          for e in emp_ids[::10]))
+    summaries.rebuild_all(conn)
+    conn.commit()
+    conn.execute("ANALYZE;")
+    conn.close()
+    return emp_ids, dates
+
+
+# --- Measurement ---
+def measure(fn, repeat, setup=None):
+    # Timings first, then one extra run under tracemalloc for peak memory.
+    # Streamlit caches are cleared before every run so no case times a cache hit;
+    # setup, if any, runs untimed before each one.
+    setup = setup or (lambda: None)
+    timings, rows = [], None
+    for _ in range(repeat):
+        setup()
+        st.cache_data.clear()
+        start = time.perf_counter()
+        rows = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    setup()
+    st.cache_data.clear()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "peak_kib": round(peak / 1024, 1),
+        "rows": rows if isinstance(rows, int) else None,
+    }
+
+
+def page_cases(path, page_size=50):
+    cases = {}
+    for table, (select, keys, _) in db.LISTING_QUERIES.items():
+        # A key roughly in the middle of the table, to show seek cost is flat
+        _, rows = db.read_query(f"SELECT COUNT(*) FROM {table}", path=path)
+        offset = rows[0][0] // 2
+        _, rows = db.read_query(
+            f"SELECT {', '.join(k.split('.')[-1] for k in keys)} FROM {table} "
+            f"ORDER BY {', '.join(k.split('.')[-1] for k in keys)} LIMIT 1 OFFSET ?",
+            (offset,), path,
+        )
+        middle = rows[0] if rows else None
+
+        def query(after=None, select=select, keys=keys):
+            _, page, _ = db.fetch_page(select, keys, after=after, page_size=page_size, path=path)
+            return len(page)
+
+        def render(select=select, keys=keys):
+            page, _ = db.fetch_page_arrow(select, keys, page_size=page_size, path=path)
+            display_table_with_scroll(page)
+            return page.num_rows
+
+        cases[f"page.{table}.first"] = query
+        cases[f"page.{table}.middle"] = lambda m=middle, q=query: q(m)
+        cases[f"page.{table}.count"] = lambda t=table: db.read_query(f"SELECT COUNT(*) FROM {t}", path=path)[1][0][0]
+        cases[f"render.{table}"] = render
+    return cases
+
+
+def calendar_cases(path, dates):
+    # These reads are cached against leave_record; expiring it first makes
+    # every run query SQLite instead of unpickling the last result
+    start, end = dates[0], dates[-1]
+    pool = db.get_pool(path)
+
+    def uncached(query):
+        def run():
+            pool.bump(("leave_record",))
+            return query().num_rows
+        return run
+
+    return {
+        "leave.who_is_out_day": uncached(lambda: leave_calendar.who_is_out(start, start, path=path)),
+        "leave.coverage_range": uncached(lambda: leave_calendar.department_coverage(start, end, path=path)),
+        "leave.attendance_mismatches": uncached(lambda: leave_calendar.attendance_mismatches(start, end, path=path)),
+    }
+
+
+def write_cases(path, emp_ids, dates):
+    counter = iter(range(10**9))
+    future = datetime.date.fromisoformat(dates[-1])
+
+    def next_date():
+        return (future + datetime.timedelta(days=1 + next(counter))).isoformat()
+
+    def insert_employee():
+        return db.execute_write(
+            "INSERT INTO employee (emp_id, name, department_id) VALUES (?, ?, 'D00')",
+            (f"N{next(counter):09d}", "New"), tables=("employee",), path=path,
+        )
+
+    def insert_attendance():
+        return db.execute_write(
+            "INSERT INTO attendance VALUES (?, ?, 'Present')",
+            (random.choice(emp_ids), next_date()), tables=("attendance",), path=path,
+        )
+
+    def insert_department():
+        number = next(counter)
+        return db.execute_write(
+            "INSERT INTO department VALUES (?, ?)", (f"N{number:09d}", f"New {number}"),
+            tables=("department",), path=path,
+        )
+
+    def insert_leave():
+        # Runs the overlap check and the leave_index trigger
+        day = next_date()
+        return db.execute_write(
+            "INSERT INTO leave_record VALUES (?, 'Casual Leave', ?, ?, 'Approved')",
+            (random.choice(emp_ids), day, day), tables=("leave_record",), path=path,
+        )
+
+    def insert_salary():
+        return db.execute_write(
+            "INSERT INTO salary (emp_id, amount, payment_date) VALUES (?, 1000, ?)",
+            (random.choice(emp_ids), next_date()), tables=("salary",), path=path,
+        )
+
+    def import_attendance(rows=1000):
+        day = next_date()
+        csv = "employee_id,date,status\n" + "".join(f"{e},{day},Present\n" for e in emp_ids[:rows])
+        inserted, _ = importer.import_file("attendance", io.BytesIO(csv.encode()), "bench.csv", path=path)
+        return inserted
+
+    def refresh_summaries(rows=100):
+        # A day of attendance for `rows` employees dirties that many employee-months
+        day = next_date()
+        pool = db.get_pool(path)
+        with pool.writer() as conn:
+            conn.executemany("INSERT INTO attendance VALUES (?, ?, 'Present')", [(e, day) for e in emp_ids[:rows]])
+        pool.bump(("attendance",))
+        summaries.refresh(path)
+        return rows
+
+    def delete_attendance_batch(size=100):
+        _, keys = db.read_query(
+            "SELECT employee_id, date FROM attendance WHERE date > ? LIMIT ?", (dates[-1], size), path,
+        )
+        return db.delete_many("attendance", keys, path=path)
+
+    def delete_employee():
+        # Cascades to the employee's salary, attendance, leave and summary rows.
+        # Taken off the end of emp_ids so later cases don't pick a deleted one.
+        emp_id = emp_ids.pop()
+        deleted = db.delete_many("employee", [(emp_id,)], path=path)
+        summaries.refresh(path)
+        return deleted
+
+    return {
+        "insert.employee": insert_employee,
+        "insert.attendance": insert_attendance,
+        "insert.department": insert_department,
+        "insert.leave_record": insert_leave,
+        "insert.salary": insert_salary,
+        "import.attendance_1000": import_attendance,
+        "delete.attendance_batch_100": delete_attendance_batch,
+        "delete.employee_cascade": delete_employee,
+        "summaries.refresh_100": refresh_summaries,
+        "payroll.run": lambda: len(payroll.run_payroll(dates[-1][:7], path)),
+    }
+
+
+def audit_cases(path, emp_ids):
+    # record() is what a form submit pays; flush() is the batched write behind it
+    def record():
+        audit.record("BENCH", "insert", "attendance", (random.choice(emp_ids), "2099-01-01"), {"status": "Present"}, path)
+
+    return {
+        "audit.record": record,
+        "audit.flush": lambda: audit.flush(path),
+        "audit.history_record": lambda: audit.history("attendance", random.choice(emp_ids), path=path).num_rows,
+    }
+
+
+def delete_all_cases(path, tables=("leave_record", "attendance")):
+    # The "Delete All" buttons: delete, audit, refresh summaries. Each run first
+    # restores the table, untimed, from a copy taken at its first setup. Run
+    # last; the tables end up empty.
+    pool = db.get_pool(path)
+
+    def restore(table):
+        def setup():
+            with pool.writer() as conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS bench_{table} AS SELECT * FROM {table}")
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"INSERT INTO {table} SELECT * FROM bench_{table}")
+            pool.bump((table,))
+            summaries.refresh(path)
+        return setup
+
+    def delete_all(table):
+        def run():
+            deleted = db.execute_write(f"DELETE FROM {table}", tables=(table,), path=path)
+            audit.record("BENCH", "delete_all", table, detail={"rows": deleted}, path=path)
+            summaries.refresh(path)
+            return deleted
+        return run
+
+    return {f"delete_all.{table}": (restore(table), delete_all(table)) for table in tables}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(employees, days, repeat, scratch):
+    emp_ids, dates = generate(scratch, employees, days)
+    cases = page_cases(scratch)
+    cases.update(calendar_cases(scratch, dates))
+    cases.update(write_cases(scratch, emp_ids, dates))
+    cases.update(audit_cases(scratch, emp_ids))
+    cases.update(delete_all_cases(scratch))
+    results = {}
+    for name, case in cases.items():
+        setup, fn = case if isinstance(case, tuple) else (None, case)
+        # Payroll, imports and whole-table deletes are heavy; a few runs are enough
+        heavy = name.startswith(("payroll", "import", "delete_all"))
+        results[name] = measure(fn, max(3, repeat // 5) if heavy else repeat, setup)
+        print(f"{name:40s} p50 {results[name]['p50_ms']:>10.2f} ms  p95 {results[name]['p95_ms']:>10.2f} ms  "
+              f"peak {results[name]['peak_kib']:>10.1f} KiB")
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'case':40s} {'p50 before':>12s} {'p50 after':>12s} {'change':>8s}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before and before["p50_ms"]:
+            change = (now["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+            print(f"{name:40s} {before['p50_ms']:>12.2f} {now['p50_ms']:>12.2f} {change:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the HRM pages against a synthetic database.")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--employees", type=int, help="override the scale's employee count")
+    parser.add_argument("--days", type=int, help="override the scale's working days of attendance")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare p50 against")
+    args = parser.parse_args(argv)
+
+    employees, days = SCALES[args.scale]
+    employees = args.employees or employees
+    days = args.days or days
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        results = run(employees, days, args.repeat, scratch)
+        audit.flush(scratch)
+        db.get_pool(scratch).close()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "scale": args.scale,
+            "employees": employees,
+            "days": days,
+            "repeat": args.repeat,
+            "sqlite": sqlite3.sqlite_version,
+            "python": sys.version.split()[0],
+            "total_s": round(time.perf_counter() - started, 1),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+import datetime
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+
+import pyarrow as pa
+import streamlit as st
+
+import metrics
+
+DB_PATH = "hrm.db"
+
+# Primary key of each listing table, in index order; used for keyset pagination
+TABLE_KEYS = {
+    "employee": ("emp_id",),
+    "department": ("department_id",),
+    "salary": ("emp_id", "payment_date"),
+    "attendance": ("employee_id", "date"),
+    "leave_record": ("emp_id", "start_date", "end_date"),
+}
+
+# Page listing queries, the keys they are paged on and the tables they read
+LISTING_QUERIES = {
+    "employee": ("SELECT * FROM employee", TABLE_KEYS["employee"], ("employee",)),
+    "department": ("SELECT * FROM department", TABLE_KEYS["department"], ("department",)),
+    "salary": ("""
+        SELECT s.emp_id, e.name, s.amount, s.total_monthly_stipend, s.amount_deducted,
+               s.bank_details, s.payment_method, s.payment_date
+        FROM salary s
+        JOIN employee e ON s.emp_id = e.emp_id
+    """, ("s.emp_id", "s.payment_date"), ("salary", "employee")),
+    "attendance": ("SELECT * FROM attendance", TABLE_KEYS["attendance"], ("attendance",)),
+    "leave_record": ("SELECT * FROM leave_record", TABLE_KEYS["leave_record"], ("leave_record",)),
+}
+
+# Filter controls each listing page offers, as parameterized WHERE clauses.
+# Each takes one value; unset filters are left out of the query.
+LISTING_FILTERS = {
+    "employee": {
+        "employee": "emp_id = ?",
+        "department": "department_id = ?",
+    },
+    "salary": {
+        "date_from": "s.payment_date >= ?",
+        "date_to": "s.payment_date <= ?",
+        "employee": "s.emp_id = ?",
+        "department": "e.department_id = ?",
+        "payment_method": "s.payment_method = ?",
+    },
+    "attendance": {
+        "date_from": "date >= ?",
+        "date_to": "date <= ?",
+        "employee": "employee_id = ?",
+        "department": "employee_id IN (SELECT emp_id FROM employee WHERE department_id = ?)",
+        "status": "status = ?",
+    },
+    "leave_record": {
+        # A leave matches a date range when it overlaps it
+        "date_from": "end_date >= ?",
+        "date_to": "start_date <= ?",
+        "employee": "emp_id = ?",
+        "department": "emp_id IN (SELECT emp_id FROM employee WHERE department_id = ?)",
+        "status": "status = ?",
+        "leave_type": "leave_type = ?",
+    },
+}
+
+# Arrow types for the display path; other columns are inferred per batch
+ARROW_TYPES = {
+    "dob": pa.date32(),
+    "payment_date": pa.date32(),
+    "date": pa.date32(),
+    "start_date": pa.date32(),
+    "end_date": pa.date32(),
+    "amount": pa.int64(),
+    "total_monthly_stipend": pa.int64(),
+    "amount_deducted": pa.int64(),
+    "basic_amount": pa.int64(),
+    "gross_stipend": pa.int64(),
+    "deductions": pa.int64(),
+    "gross_pay": pa.int64(),
+    "deduction": pa.int64(),
+    "net_pay": pa.int64(),
+}
+ARROW_BATCH_SIZE = 10_000
+
+# Rows in these tables go away via ON DELETE CASCADE when the parent is deleted
+DEPENDENT_TABLES = {
+    "employee": ("salary", "attendance", "leave_record", "attendance_monthly", "payroll_monthly", "payroll_run"),
+}
+
+# --- Schema ---
+# The DDL itself is versioned in migrations.py; these are shared by the
+# leave_index backfill and the leave calendar queries.
+
+# Dates are indexed as whole julian day numbers; queries must use the same form
+def day_number(expr):
+    return f"CAST(julianday({expr}) AS INTEGER)"
+
+
+LEAVE_INDEX_INSERT = (
+    "INSERT INTO leave_index (start_day, end_day, emp_id, start_date, end_date, status) "
+    "SELECT {start}, {end}, {row}.emp_id, {row}.start_date, {row}.end_date, {row}.status "
+    "{source} WHERE {start} <= {end};"
+)
+
+
+# Applied to every connection the pool opens. WAL lets readers keep going
+# while the single writer commits; NORMAL sync is safe under WAL.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA busy_timeout = 5000;",
+    "PRAGMA cache_size = -20000;",
+    "PRAGMA mmap_size = 268435456;",
+    "PRAGMA temp_store = MEMORY;",
+)
+
+
+def _connect(path):
+    # isolation_level=None: we issue BEGIN/COMMIT ourselves in writer()
+    conn = sqlite3.connect(
+        path, check_same_thread=False, isolation_level=None, factory=metrics.InstrumentedConnection
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# --- Connection pool ---
+class ConnectionPool:
+    def __init__(self, path, max_readers=8):
+        self.path = path
+        self.max_readers = max_readers
+        self._readers = queue.LifoQueue()
+        self._opened = 0
+        self._open_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = _connect(path)
+        self._versions = {}
+
+    def version(self, table):
+        return self._versions.get(table, 0)
+
+    def bump(self, tables):
+        # Called after a committed write so cached reads of these tables expire
+        with self._open_lock:
+            for table in tables:
+                for name in (table,) + DEPENDENT_TABLES.get(table, ()):
+                    self._versions[name] = self._versions.get(name, 0) + 1
+
+    def _get_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._open_lock:
+            if self._opened < self.max_readers:
+                self._opened += 1
+                return _connect(self.path)
+        return self._readers.get()
+
+    @contextmanager
+    def reader(self):
+        conn = self._get_reader()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        # One writer at a time; BEGIN IMMEDIATE takes the write lock up front
+        # so concurrent sessions queue here instead of failing with "database is locked".
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            else:
+                self._writer.execute("COMMIT")
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+@st.cache_resource
+def get_pool(path=DB_PATH):
+    return ConnectionPool(path)
+
+
+# --- Query helpers ---
+def _read(sql, params, path):
+    with get_pool(path).reader() as conn:
+        cursor = conn.execute(sql, params)
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+    return columns, rows
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def _cached_read(path, sql, params, versions):
+    # versions is part of the cache key: any write to a listed table misses
+    return _read(sql, params, path)
+
+
+def read_query(sql, params=(), path=DB_PATH, tables=()):
+    # Pass the tables a query reads to serve reruns from cache until one of
+    # them is written through execute_write/delete_many/bump.
+    if tables:
+        pool = get_pool(path)
+        versions = tuple((table, pool.version(table)) for table in tables)
+        return _cached_read(path, sql, tuple(params), versions)
+    return _read(sql, params, path)
+
+
+def read_column(sql, params=(), path=DB_PATH, tables=()):
+    _, rows = read_query(sql, params, path, tables)
+    return [row[0] for row in rows]
+
+
+def execute_write(sql, params=(), tables=(), path=DB_PATH):
+    pool = get_pool(path)
+    with pool.writer() as conn:
+        rowcount = conn.execute(sql, params).rowcount
+    pool.bump(tables)
+    return rowcount
+
+
+def sql_value(value):
+    # Dates are stored as ISO text; keys read back through Arrow are dates
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def delete_many(table, key_rows, path=DB_PATH):
+    # One executemany in one transaction, however many rows were selected
+    key_rows = [tuple(sql_value(v) for v in row) for row in key_rows]
+    keys = TABLE_KEYS[table]
+    where = " AND ".join(f"{key} = ?" for key in keys)
+    pool = get_pool(path)
+    with pool.writer() as conn:
+        deleted = conn.executemany(f"DELETE FROM {table} WHERE {where}", key_rows).rowcount
+    pool.bump((table,))
+    return deleted
+
+
+# --- Arrow reads ---
+def arrow_array(values, arrow_type):
+    if arrow_type == pa.date32():
+        strings = pa.array(values, pa.string())
+        try:
+            return strings.cast(pa.date32())
+        except pa.ArrowInvalid:
+            return strings
+    try:
+        return pa.array(values, arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite columns can hold mixed types; show them as text
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def _arrow_column(name, chunks):
+    if not chunks:
+        return pa.chunked_array([], ARROW_TYPES.get(name, pa.string()))
+    target = next((c.type for c in chunks if c.type != pa.null()), pa.null())
+    try:
+        return pa.chunked_array([c if c.type == target else c.cast(target) for c in chunks], target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return pa.chunked_array([c.cast(pa.string()) for c in chunks], pa.string())
+
+
+def _read_arrow(sql, params, path, batch_size=ARROW_BATCH_SIZE):
+    # Rows go from the cursor into typed Arrow columns one batch at a time,
+    # so only batch_size Python tuples are alive at once.
+    with get_pool(path).reader() as conn:
+        cursor = conn.execute(sql, params)
+        columns = [desc[0] for desc in cursor.description]
+        chunks = [[] for _ in columns]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for i, values in enumerate(zip(*rows)):
+                chunks[i].append(arrow_array(values, ARROW_TYPES.get(columns[i])))
+            del rows
+    return pa.table([_arrow_column(name, c) for name, c in zip(columns, chunks)], names=columns)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _cached_read_arrow(path, sql, params, versions):
+    return _read_arrow(sql, params, path)
+
+
+def read_arrow(sql, params=(), path=DB_PATH, tables=()):
+    # Same caching contract as read_query, but returns a pyarrow.Table
+    if tables:
+        pool = get_pool(path)
+        versions = tuple((table, pool.version(table)) for table in tables)
+        return _cached_read_arrow(path, sql, tuple(params), versions)
+    return _read_arrow(sql, params, path)
+
+
+# --- Filters ---
+def build_where(table, values):
+    # values: filter name -> value from the page controls
+    clauses, params = [], []
+    for name, clause in LISTING_FILTERS.get(table, {}).items():
+        value = values.get(name)
+        if value not in (None, "", "All"):
+            clauses.append(clause)
+            params.append(sql_value(value))
+    return clauses, params
+
+
+def filtered_sql(select, where=()):
+    return f"{select} WHERE {' AND '.join(where)}" if where else select
+
+
+# --- Pagination ---
+def _page_sql(select, keys, after, page_size, where=(), params=()):
+    # Keyset (seek) pagination: continue strictly after the last key seen, so
+    # the cost of a page does not depend on how deep into the table it is.
+    clauses = list(where)
+    params = list(params)
+    if after is not None:
+        clauses.append(f"({', '.join(keys)}) > ({', '.join('?' * len(keys))})")
+        params.extend(after)
+    sql = filtered_sql(select, clauses) + f" ORDER BY {', '.join(keys)} LIMIT ?"
+    params.append(page_size + 1)
+    return sql, params
+
+
+def fetch_page(select, keys, after=None, page_size=50, path=DB_PATH, tables=(), where=(), params=()):
+    columns, rows = read_query(*_page_sql(select, keys, after, page_size, where, params), path, tables)
+    next_key = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        positions = [columns.index(key.split(".")[-1]) for key in keys]
+        next_key = tuple(rows[-1][i] for i in positions)
+    return columns, rows, next_key
+
+
+def fetch_page_arrow(select, keys, after=None, page_size=50, path=DB_PATH, tables=(), where=(), params=()):
+    table = read_arrow(*_page_sql(select, keys, after, page_size, where, params), path, tables)
+    next_key = None
+    if table.num_rows > page_size:
+        table = table.slice(0, page_size)
+        next_key = tuple(sql_value(table.column(key.split(".")[-1])[-1].as_py()) for key in keys)
+    return table, next_key
+
+
+def count_rows(table, path=DB_PATH, where=(), params=()):
+    if not where:
+        _, rows = read_query(f"SELECT COUNT(*) FROM {table}", path=path, tables=(table,))
+        return rows[0][0]
+    select, _, tables = LISTING_QUERIES[table]
+    # Department filters read employee through a subquery
+    _, rows = read_query(
+        f"SELECT COUNT(*) FROM ({filtered_sql(select, where)})", params, path, tables + ("employee",)
+    )
+    return rows[0][0]
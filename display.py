@@ -0,0 +1,32 @@
+import pyarrow as pa
+import streamlit as st
+
+import metrics
+
+
+# --- Display table helper ---
+def display_table_with_scroll(df):
+    # Accepts a DataFrame or a pyarrow.Table. Labels are column config,
+    # so the data itself is handed to st.dataframe without a copy.
+    names = df.column_names if isinstance(df, pa.Table) else df.columns
+    with metrics.timed("column_labels"):
+        column_config = {
+            col: st.column_config.Column(col.replace('_', ' ').title())
+            for col in names if isinstance(col, str)
+        }
+    st.markdown("""
+        <style>
+        .table-container {
+            overflow-x: auto;
+            width: 100%;
+            margin-bottom: 1rem;
+        }
+        table {
+            width: 100% !important;
+        }
+        </style>
+        """, unsafe_allow_html=True)
+    st.markdown('<div class="table-container">', unsafe_allow_html=True)
+    with metrics.timed("st.dataframe"):
+        st.dataframe(df, column_config=column_config, use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
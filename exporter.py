@@ -0,0 +1,92 @@
+import csv
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import db
+
+# Rows held in Python at any one time; also the Parquet row group size
+CHUNK_SIZE = 10_000
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_dir(path=db.DB_PATH):
+    # Exports live next to the database they came from
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "exports")
+
+
+def export_sql(table, filters):
+    # Same SELECT and filters as the listing page, in key order
+    select, keys, _ = db.LISTING_QUERIES[table]
+    where, params = db.build_where(table, filters)
+    return db.filtered_sql(select, where) + f" ORDER BY {', '.join(keys)}", params
+
+
+# --- Writers ---
+# Each reads the cursor chunk_size rows at a time and writes them out before
+# fetching more, so memory stays flat however many rows match.
+def _write_csv(cursor, columns, dest, chunk_size, progress):
+    written = 0
+    with open(dest, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            written += len(rows)
+            progress(written)
+    return written
+
+
+def _write_parquet(cursor, columns, dest, chunk_size, progress):
+    # The schema is fixed up front; one row group per chunk
+    schema = pa.schema([(name, db.ARROW_TYPES.get(name, pa.string())) for name in columns])
+    written = 0
+    with pq.ParquetWriter(dest, schema) as writer:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            arrays = []
+            for field, values in zip(schema, zip(*rows)):
+                array = db.arrow_array(values, field.type)
+                if array.type != field.type:
+                    try:
+                        array = array.cast(field.type)
+                    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                        raise ValueError(f"Column {field.name} holds values of mixed types; export as CSV instead")
+                arrays.append(array)
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=chunk_size)
+            written += len(rows)
+            del rows, arrays
+            progress(written)
+    return written
+
+
+WRITERS = {
+    "csv": _write_csv,
+    "parquet": _write_parquet,
+}
+
+
+def export_table(table, filters, fmt, dest, chunk_size=CHUNK_SIZE, progress=None, path=db.DB_PATH):
+    # Writes to dest.part and renames on success, so a half-written export never shows up
+    sql, params = export_sql(table, filters)
+    partial = dest + ".part"
+    try:
+        with db.get_pool(path).reader() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description]
+            written = WRITERS[fmt](cursor, columns, partial, chunk_size, progress or (lambda n: None))
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, dest)
+    return written
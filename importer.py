@@ -0,0 +1,179 @@
+import sqlite3
+
+import pandas as pd
+
+import db
+
+CHUNK_SIZE = 5000
+
+# Mirrors the constraints in initialize_database: NOT NULL columns, the
+# status CHECK, the composite primary keys and the emp_id foreign keys.
+IMPORT_SPECS = {
+    "employee": {
+        "columns": ["emp_id", "name", "address", "dob", "position", "department_id"],
+        "required": ["emp_id", "name"],
+        "dates": ["dob"],
+        "integers": [],
+        "choices": {},
+        "employee_fk": None,
+    },
+    "salary": {
+        "columns": ["emp_id", "amount", "payment_date", "bank_details",
+                    "total_monthly_stipend", "amount_deducted", "payment_method"],
+        "required": ["emp_id", "amount", "payment_date"],
+        "dates": ["payment_date"],
+        "integers": ["amount", "total_monthly_stipend", "amount_deducted"],
+        "choices": {},
+        "employee_fk": "emp_id",
+    },
+    "attendance": {
+        "columns": ["employee_id", "date", "status"],
+        "required": ["employee_id", "date", "status"],
+        "dates": ["date"],
+        "integers": [],
+        "choices": {"status": ("Present", "Absent")},
+        "employee_fk": "employee_id",
+    },
+}
+
+
+# --- File readers ---
+def _read_csv_chunks(file, chunk_size):
+    # dtype=str keeps IDs like "007" intact; empty cells stay empty strings
+    return pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+
+def _read_excel_chunks(file, chunk_size):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Excel import needs the openpyxl package; upload a CSV instead.")
+    sheet = load_workbook(file, read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(col).strip() for col in next(rows)]
+    batch, start = [], 0
+    for row in rows:
+        batch.append(["" if v is None else str(v) for v in row])
+        if len(batch) == chunk_size:
+            yield pd.DataFrame(batch, columns=header, index=range(start, start + len(batch)))
+            start += len(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=header, index=range(start, start + len(batch)))
+
+
+def read_chunks(file, filename, chunk_size=CHUNK_SIZE):
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return _read_excel_chunks(file, chunk_size)
+    return _read_csv_chunks(file, chunk_size)
+
+
+# --- Validation ---
+def _existing_keys(table, chunk, path):
+    keys = list(db.TABLE_KEYS[table])
+    candidates = list(chunk[keys].itertuples(index=False, name=None))
+    if not candidates:
+        return set()
+    placeholders = ", ".join(["(" + ", ".join("?" * len(keys)) + ")"] * len(candidates))
+    params = [value for key in candidates for value in key]
+    _, rows = db.read_query(
+        f"SELECT {', '.join(keys)} FROM {table} WHERE ({', '.join(keys)}) IN (VALUES {placeholders})",
+        params,
+        path,
+    )
+    return set(rows)
+
+
+def validate_chunk(table, chunk, known_emp_ids, path=db.DB_PATH):
+    # Returns ([(row number, clean row), ...], [(row number, reason), ...])
+    spec = IMPORT_SPECS[table]
+    chunk = chunk.rename(columns=lambda c: str(c).strip().lower().replace(" ", "_"))
+    for col in spec["columns"]:
+        if col not in chunk.columns:
+            chunk[col] = ""
+    chunk = chunk[spec["columns"]].apply(lambda col: col.str.strip())
+    reasons = pd.Series("", index=chunk.index)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    for col in spec["required"]:
+        reject(chunk[col] == "", f"{col} is required")
+    for col in spec["dates"]:
+        parsed = pd.to_datetime(chunk[col], errors="coerce", format="ISO8601")
+        reject(parsed.isna() & (chunk[col] != ""), f"{col} is not a valid date")
+        chunk[col] = parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), chunk[col])
+    for col in spec["integers"]:
+        numbers = pd.to_numeric(chunk[col], errors="coerce")
+        reject((numbers.isna() | (numbers % 1 != 0)) & (chunk[col] != ""), f"{col} must be a whole number")
+    for col, allowed in spec["choices"].items():
+        reject(~chunk[col].isin(allowed), f"{col} must be one of {', '.join(allowed)}")
+    if spec["employee_fk"]:
+        fk = spec["employee_fk"]
+        reject(~chunk[fk].isin(known_emp_ids) & (chunk[fk] != ""), f"{fk} does not match any employee")
+
+    keys = list(db.TABLE_KEYS[table])
+    reject(chunk.duplicated(subset=keys), "duplicate key within the file")
+    candidates = chunk[reasons == ""]
+    existing = _existing_keys(table, candidates, path)
+    if existing:
+        in_db = pd.Series(
+            [key in existing for key in candidates[keys].itertuples(index=False, name=None)],
+            index=candidates.index,
+        )
+        reject(in_db.reindex(chunk.index, fill_value=False), "key already exists")
+
+    # +2: one for the header line, one because spreadsheet rows start at 1
+    good = chunk[reasons == ""]
+    records = [
+        (int(i) + 2, tuple(_to_sql(col, v, spec) for col, v in zip(spec["columns"], row)))
+        for i, row in zip(good.index, good.itertuples(index=False, name=None))
+    ]
+    rejects = [(int(i) + 2, reason) for i, reason in reasons[reasons != ""].items()]
+    return records, rejects
+
+
+def _to_sql(col, value, spec):
+    # Empty optional cells become NULL, matching what the single-row forms write
+    if value == "":
+        return None
+    if col in spec["integers"]:
+        return int(float(value))
+    return value
+
+
+# --- Import pipeline ---
+def import_file(table, file, filename, chunk_size=CHUNK_SIZE, progress=None, path=db.DB_PATH):
+    spec = IMPORT_SPECS[table]
+    known_emp_ids = set(db.read_column("SELECT emp_id FROM employee", path=path, tables=("employee",))) if spec["employee_fk"] else set()
+    insert_sql = (
+        f"INSERT INTO {table} ({', '.join(spec['columns'])}) "
+        f"VALUES ({', '.join('?' * len(spec['columns']))})"
+    )
+    pool = db.get_pool(path)
+    inserted, rejects, processed = 0, [], 0
+
+    for chunk in read_chunks(file, filename, chunk_size):
+        records, chunk_rejects = validate_chunk(table, chunk, known_emp_ids, path)
+        rejects.extend(chunk_rejects)
+        if records:
+            try:
+                # One short transaction per chunk keeps the write lock bounded
+                with pool.writer() as conn:
+                    conn.executemany(insert_sql, [record for _, record in records])
+                inserted += len(records)
+            except sqlite3.IntegrityError:
+                # Something changed underneath us; fall back to row-by-row for this chunk
+                with pool.writer() as conn:
+                    for row_number, record in records:
+                        try:
+                            conn.execute(insert_sql, record)
+                            inserted += 1
+                        except sqlite3.IntegrityError as e:
+                            rejects.append((row_number, str(e)))
+            pool.bump((table,))
+        processed += len(chunk)
+        if progress:
+            progress(processed)
+
+    return inserted, rejects
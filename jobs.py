@@ -0,0 +1,233 @@
+import io
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import streamlit as st
+
+import db
+import summaries
+
+# "thread" runs jobs on a pool inside the app process, "process" on a pool
+# of local worker processes, "worker" only queues them for `python jobs.py worker`
+EXECUTOR = os.environ.get("HRM_JOB_EXECUTOR", "thread")
+MAX_WORKERS = int(os.environ.get("HRM_JOB_WORKERS", "2"))
+POLL_SECONDS = 1.0
+RETENTION_DAYS = 30
+KEEP_REJECTS = 1000
+ACTIVE = ("queued", "running")
+
+EXECUTORS = {
+    "thread": lambda workers: ThreadPoolExecutor(workers, thread_name_prefix="hrm-job"),
+    # spawn, not fork: the app process holds SQLite connections and threads
+    "process": lambda workers: ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")),
+    "worker": lambda workers: None,
+}
+
+
+# --- Job kinds ---
+# Each takes (params, payload, progress, path) and returns (result, tables
+# written); result must be JSON-serializable. Their modules load pandas, so
+# they are imported when a job runs rather than with the app.
+def _import_job(params, payload, progress, path):
+    import importer
+    inserted, rejects = importer.import_file(
+        params["table"], io.BytesIO(payload), params["filename"],
+        progress=lambda n: progress(n, f"Processed {n} rows"), path=path,
+    )
+    summaries.refresh(path)
+    result = {"inserted": inserted, "rejected": len(rejects), "rejects": rejects[:KEEP_REJECTS]}
+    return result, (params["table"],) + summaries.SUMMARY_TABLES + ("summary_dirty",)
+
+
+def _payroll_job(params, payload, progress, path):
+    import payroll
+    progress(0, f"Computing payroll for {params['month']}")
+    result = payroll.run_payroll(params["month"], path)
+    return {"employees": len(result)}, ("payroll_run",) + summaries.SUMMARY_TABLES + ("summary_dirty",)
+
+
+def _export_job(params, payload, progress, path):
+    import exporter
+    table, fmt = params["table"], params["format"]
+    folder = exporter.export_dir(path)
+    os.makedirs(folder, exist_ok=True)
+    dest = os.path.join(folder, f"{table}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.{fmt}")
+    rows = exporter.export_table(
+        table, params["filters"], fmt, dest,
+        progress=lambda n: progress(n, f"Exported {n} rows"), path=path,
+    )
+    return {"file": dest, "rows": rows, "format": fmt}, ()
+
+
+KINDS = {
+    "import": _import_job,
+    "payroll": _payroll_job,
+    "export": _export_job,
+}
+
+
+# --- Executor ---
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _alive(worker):
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True  # another machine's worker; not ours to judge
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def recover(path=db.DB_PATH):
+    # Jobs whose worker died with them are failed; old finished jobs are dropped
+    pool = db.get_pool(path)
+    with pool.writer() as conn:
+        running = conn.execute("SELECT id, worker FROM jobs WHERE status = 'running'").fetchall()
+        for job_id, worker in running:
+            if not _alive(worker):
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Interrupted: worker exited', "
+                    "payload = NULL, finished_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,),
+                )
+        expired = conn.execute(
+            "SELECT id, result FROM jobs WHERE status IN ('done', 'failed') AND finished_at < datetime('now', ?)",
+            (f"-{RETENTION_DAYS} days",),
+        ).fetchall()
+        for job_id, result in expired:
+            # Export files go with their job
+            output = json.loads(result).get("file") if result else None
+            if output and os.path.exists(output):
+                os.remove(output)
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id")]
+
+
+@st.cache_resource
+def get_executor(path=db.DB_PATH, kind=EXECUTOR, workers=MAX_WORKERS):
+    # One executor per app process; anything with submit(fn, *args) will do
+    executor = EXECUTORS[kind](workers)
+    queued = recover(path)
+    if executor is not None:
+        for job_id in queued:
+            executor.submit(run, job_id, path)
+    return executor
+
+
+# --- Submit and poll ---
+def submit(kind, params, payload=None, path=db.DB_PATH):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    with db.get_pool(path).writer() as conn:
+        job_id = conn.execute(
+            "INSERT INTO jobs (kind, params, payload) VALUES (?, ?, ?)", (kind, json.dumps(params), payload),
+        ).lastrowid
+    executor = get_executor(path)
+    if executor is not None:
+        executor.submit(run, job_id, path)
+    return job_id
+
+
+def get(job_id, path=db.DB_PATH):
+    # Uncached: jobs change under other threads and processes
+    columns, rows = db.read_query("""
+        SELECT id, kind, params, status, progress, message, result, error,
+               submitted_at, started_at, finished_at
+        FROM jobs WHERE id = ?
+    """, (job_id,), path)
+    if not rows:
+        return None
+    job = dict(zip(columns, rows[0]))
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def recent(limit=20, path=db.DB_PATH):
+    return db.read_query("""
+        SELECT id, kind, status, progress, message, error, submitted_at, finished_at
+        FROM jobs ORDER BY id DESC LIMIT ?
+    """, (limit,), path)
+
+
+# --- Run ---
+def _claim(conn, job_id):
+    return conn.execute(
+        "UPDATE jobs SET status = 'running', worker = ?, started_at = CURRENT_TIMESTAMP "
+        "WHERE id = ? AND status = 'queued'", (_worker_name(), job_id),
+    ).rowcount == 1
+
+
+def claim_next(path=db.DB_PATH):
+    with db.get_pool(path).writer() as conn:
+        row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row and _claim(conn, row[0]):
+            return row[0]
+    return None
+
+
+def execute(job_id, path=db.DB_PATH):
+    # Runs a job this worker has already claimed
+    pool = db.get_pool(path)
+    with pool.reader() as conn:
+        kind, params, payload = conn.execute(
+            "SELECT kind, params, payload FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+
+    def progress(done, message=None):
+        with pool.writer() as conn:
+            conn.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?", (done, message, job_id))
+
+    try:
+        result, tables = KINDS[kind](json.loads(params), payload, progress, path)
+    except Exception as e:
+        with pool.writer() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, finished_at = CURRENT_TIMESTAMP "
+                "WHERE id = ?", (f"{type(e).__name__}: {e}", job_id),
+            )
+        traceback.print_exc()
+        return
+    result["tables"] = list(tables)
+    with pool.writer() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, payload = NULL, message = NULL, "
+            "finished_at = CURRENT_TIMESTAMP WHERE id = ?", (json.dumps(result), job_id),
+        )
+    pool.bump(tables)
+
+
+def run(job_id, path=db.DB_PATH):
+    with db.get_pool(path).writer() as conn:
+        claimed = _claim(conn, job_id)
+    if claimed:
+        execute(job_id, path)
+
+
+def work(path=db.DB_PATH):
+    # Standalone worker loop for HRM_JOB_EXECUTOR=worker
+    recover(path)
+    while True:
+        job_id = claim_next(path)
+        if job_id is None:
+            time.sleep(POLL_SECONDS)
+        else:
+            execute(job_id, path)
+
+
+if __name__ == "__main__":
+    # python jobs.py worker [db path]
+    if len(sys.argv) < 2 or sys.argv[1] != "worker":
+        sys.exit("usage: python jobs.py worker [db path]")
+    work(sys.argv[2] if len(sys.argv) > 2 else db.DB_PATH)
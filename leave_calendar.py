@@ -0,0 +1,140 @@
+import sys
+
+import db
+
+# Reporting ranges are capped so the per-day coverage grid stays small
+MAX_RANGE_DAYS = 366
+OUT_STATUSES = ("Approved",)
+
+START_DAY = db.day_number("?")
+END_DAY = db.day_number("?")
+
+
+def _in(values):
+    return ", ".join("?" * len(values))
+
+
+# --- Index maintenance ---
+def rebuild_index(conn):
+    conn.execute("DELETE FROM leave_index")
+    conn.execute(db.LEAVE_INDEX_INSERT.format(
+        start=db.day_number("l.start_date"), end=db.day_number("l.end_date"), row="l",
+        source="FROM leave_record l",
+    ))
+
+
+def rebuild(path=db.DB_PATH):
+    pool = db.get_pool(path)
+    with pool.writer() as conn:
+        rebuild_index(conn)
+    pool.bump(("leave_record",))
+
+
+# --- Queries ---
+# All of these read leave_index, which only changes with leave_record, so
+# they are cached against the leave_record version. {statuses} is a list of
+# placeholders and {where} an optional department filter.
+CONFLICTS_SQL = """
+    SELECT emp_id, leave_type, start_date, end_date, status FROM leave_record
+    WHERE emp_id = ? AND start_date <= ? AND end_date >= ? AND status IS NOT 'Rejected'
+    ORDER BY start_date
+"""
+
+# R*Tree window query: every leave whose box overlaps [start, end]
+WHO_IS_OUT_SQL = f"""
+    SELECT i.emp_id, e.name, e.department_id, l.leave_type, i.start_date, i.end_date, i.status
+    FROM leave_index i
+    JOIN employee e ON e.emp_id = i.emp_id
+    JOIN leave_record l ON l.emp_id = i.emp_id AND l.start_date = i.start_date AND l.end_date = i.end_date
+    WHERE i.start_day <= {END_DAY} AND i.end_day >= {START_DAY}
+      AND i.status IN ({{statuses}}) {{where}}
+    ORDER BY i.start_date, i.emp_id
+"""
+
+# One row per day and department; each day is a point query against the R*Tree
+COVERAGE_SQL = f"""
+    WITH RECURSIVE days(day) AS (
+        SELECT {START_DAY}
+        UNION ALL
+        SELECT day + 1 FROM days WHERE day < {END_DAY} AND day < {START_DAY} + ? - 1
+    ),
+    heads AS (
+        SELECT department_id, COUNT(*) AS headcount FROM employee {{where}} GROUP BY department_id
+    ),
+    out AS (
+        SELECT d.day, e.department_id, COUNT(DISTINCT i.emp_id) AS out
+        FROM days d
+        JOIN leave_index i ON i.start_day <= d.day AND i.end_day >= d.day
+        JOIN employee e ON e.emp_id = i.emp_id
+        WHERE i.status IN ({{statuses}})
+        GROUP BY d.day, e.department_id
+    )
+    SELECT date(d.day + 0.5) AS date, h.department_id, h.headcount,
+           COALESCE(o.out, 0) AS out,
+           ROUND(100.0 * (h.headcount - COALESCE(o.out, 0)) / h.headcount, 2) AS coverage_pct
+    FROM days d
+    CROSS JOIN heads h
+    LEFT JOIN out o ON o.day = d.day AND o.department_id IS h.department_id
+    ORDER BY d.day, h.department_id
+"""
+
+# Absences with no approved leave behind them, and days marked Present
+# inside an approved leave
+MISMATCHES_SQL = f"""
+    SELECT 'Absent without approved leave' AS issue, a.employee_id AS emp_id, a.date
+    FROM attendance a
+    WHERE a.date BETWEEN ? AND ? AND a.status = 'Absent'
+      AND NOT EXISTS (
+        SELECT 1 FROM leave_record l
+        WHERE l.emp_id = a.employee_id AND l.start_date <= a.date AND l.end_date >= a.date
+          AND l.status = 'Approved'
+      )
+    UNION ALL
+    SELECT 'Present during approved leave', a.employee_id, a.date
+    FROM leave_index i
+    JOIN attendance a ON a.employee_id = i.emp_id
+        AND a.date BETWEEN max(i.start_date, ?) AND min(i.end_date, ?)
+    WHERE i.start_day <= {END_DAY} AND i.end_day >= {START_DAY}
+      AND i.status = 'Approved' AND a.status = 'Present'
+    ORDER BY 3, 2
+"""
+
+
+def conflicts(emp_id, start_date, end_date, path=db.DB_PATH):
+    # The leaves that would make a new request for this employee overlap
+    return db.read_query(
+        CONFLICTS_SQL, (emp_id, db.sql_value(end_date), db.sql_value(start_date)), path, ("leave_record",),
+    )
+
+
+def who_is_out(start_date, end_date, department_id=None, statuses=OUT_STATUSES, path=db.DB_PATH):
+    where = "AND e.department_id = ?" if department_id else ""
+    params = (db.sql_value(end_date), db.sql_value(start_date)) + tuple(statuses)
+    return db.read_arrow(
+        WHO_IS_OUT_SQL.format(statuses=_in(statuses), where=where),
+        params + ((department_id,) if department_id else ()), path, ("leave_record", "employee"),
+    )
+
+
+def department_coverage(start_date, end_date, department_id=None, statuses=OUT_STATUSES, path=db.DB_PATH):
+    # Headcount, people out and the share present
+    where = "WHERE department_id = ?" if department_id else ""
+    start, end = db.sql_value(start_date), db.sql_value(end_date)
+    params = (start, end, start, MAX_RANGE_DAYS) + ((department_id,) if department_id else ()) + tuple(statuses)
+    return db.read_arrow(
+        COVERAGE_SQL.format(statuses=_in(statuses), where=where), params, path, ("leave_record", "employee"),
+    )
+
+
+def attendance_mismatches(start_date, end_date, path=db.DB_PATH):
+    # Cross-check against attendance
+    start, end = db.sql_value(start_date), db.sql_value(end_date)
+    return db.read_arrow(MISMATCHES_SQL, (start, end, start, end, end, start), path, ("leave_record", "attendance"))
+
+
+if __name__ == "__main__":
+    # python leave_calendar.py rebuild [db path]
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python leave_calendar.py rebuild [db path]")
+    rebuild(sys.argv[2] if len(sys.argv) > 2 else db.DB_PATH)
+    print("Leave index rebuilt.")
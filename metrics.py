@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("hrm.metrics")
+
+# Optional Prometheus text-format file, rewritten after every rerun
+METRICS_FILE = os.environ.get("HRM_METRICS_FILE")
+SLOW_QUERY_MS = float(os.environ.get("HRM_SLOW_QUERY_MS", "200"))
+
+_local = threading.local()
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+# --- Per-rerun collector ---
+# Spans are only kept while a rerun is active on this thread (the Streamlit
+# script thread); everywhere else recording is a cheap no-op.
+def begin_rerun(page):
+    _local.rerun = {"page": page, "start": time.perf_counter(), "spans": []}
+
+
+def current_spans():
+    rerun = getattr(_local, "rerun", None)
+    return rerun["spans"] if rerun else []
+
+
+def _add_span(kind, name, seconds, rows=None, size=None):
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return None
+    span = {"kind": kind, "name": name, "ms": seconds * 1000, "rows": rows, "bytes": size}
+    rerun["spans"].append(span)
+    return span
+
+
+@contextmanager
+def timed(name, kind="render"):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_span(kind, name, time.perf_counter() - start)
+
+
+def end_rerun():
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return
+    _local.rerun = None
+    total_ms = (time.perf_counter() - rerun["start"]) * 1000
+    spans = rerun["spans"]
+    logger.info(json.dumps({
+        "event": "rerun",
+        "page": rerun["page"],
+        "total_ms": round(total_ms, 3),
+        "sql_ms": round(sum(s["ms"] for s in spans if s["kind"] == "sql"), 3),
+        "spans": [{**s, "ms": round(s["ms"], 3)} for s in spans],
+    }))
+    for span in spans:
+        if span["kind"] == "sql" and span["ms"] >= SLOW_QUERY_MS:
+            logger.warning(json.dumps({"event": "slow_query", "page": rerun["page"], **span}))
+    _accumulate(rerun["page"], total_ms, spans)
+    if METRICS_FILE:
+        write_prometheus(METRICS_FILE)
+
+
+# --- First paint ---
+_cold = True
+
+
+def record_first_paint(screen, seconds):
+    # Time from the top of the script to the end of the first screen a
+    # session sees; "cold" is the first one in this process, imports included
+    global _cold
+    start, _cold = ("cold" if _cold else "warm"), False
+    logger.info(json.dumps({"event": "first_paint", "screen": screen, "start": start, "ms": round(seconds * 1000, 3)}))
+    with _totals_lock:
+        entry = _totals.setdefault(("hrm_first_paint", (("screen", screen), ("start", start))), [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+    if METRICS_FILE:
+        write_prometheus(METRICS_FILE)
+
+
+# --- SQL instrumentation ---
+_STATEMENT = re.compile(r"^\s*(\w+).*?\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(\w+)", re.S | re.I)
+
+
+def statement_name(sql):
+    # "SELECT attendance", "INSERT salary": bounded, safe to use as a label
+    match = _STATEMENT.match(sql)
+    if match:
+        return f"{match.group(1).upper()} {match.group(2)}"
+    return sql.split(None, 1)[0].upper() if sql.strip() else "?"
+
+
+def _row_bytes(rows):
+    size = 0
+    for row in rows:
+        for value in row:
+            size += len(value) if isinstance(value, (str, bytes)) else 8
+    return size
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _span = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._span = _add_span("sql", statement_name(sql), time.perf_counter() - start,
+                                   rows=max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._span = _add_span("sql", statement_name(sql), time.perf_counter() - start,
+                                   rows=max(self.rowcount, 0))
+
+    def _fetched(self, rows, seconds):
+        # Most of a SELECT's work happens while stepping, so fold it into the span
+        if self._span is not None:
+            self._span["ms"] += seconds * 1000
+            self._span["rows"] = (self._span["rows"] or 0) + len(rows)
+            self._span["bytes"] = (self._span["bytes"] or 0) + _row_bytes(rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        return self._fetched(rows, time.perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        return self._fetched(rows, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched([row] if row is not None else [], time.perf_counter() - start)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# --- Prometheus text endpoint ---
+def _accumulate(page, total_ms, spans):
+    with _totals_lock:
+        def add(metric, labels, seconds, rows=0):
+            entry = _totals.setdefault((metric, labels), [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += rows
+        add("hrm_rerun", (("page", page),), total_ms / 1000)
+        for span in spans:
+            add(f"hrm_{span['kind']}", (("page", page), ("name", span["name"])),
+                span["ms"] / 1000, span["rows"] or 0)
+
+
+def write_prometheus(path):
+    with _totals_lock:
+        items = sorted(_totals.items())
+    lines = []
+    for (metric, labels), (count, seconds, rows) in items:
+        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+        lines.append(f"{metric}_seconds_sum{{{label_text}}} {seconds:.6f}")
+        lines.append(f"{metric}_seconds_count{{{label_text}}} {count}")
+        if metric == "hrm_sql":
+            lines.append(f"hrm_sql_rows_total{{{label_text}}} {rows}")
+    # Write-then-rename so a scraper never reads a half-written file
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
@@ -0,0 +1,470 @@
+import sys
+import time
+
+import db
+import summaries
+
+# Rows of the source table per backfill transaction, and the pause between
+# them so other writers get the lock
+BACKFILL_BATCH = 50_000
+BACKFILL_PAUSE = 0.05
+
+TRACKING_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # Checkpoint of a migration that is part-way through its backfill
+    """
+    CREATE TABLE IF NOT EXISTS migration_progress (
+        version INTEGER PRIMARY KEY,
+        last_key,
+        rows_done INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+)
+
+
+# --- Frozen DDL ---
+# Each version's statements are written out here in full rather than built
+# from db.py, so a version that has shipped reads the same for every database.
+# Tables are created only if they do not already exist. DO NOT DROP TABLES.
+BASELINE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS department (
+        department_id TEXT PRIMARY KEY,
+        department_name TEXT UNIQUE NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS employee (
+        emp_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        address TEXT,
+        dob DATE,
+        position TEXT,
+        department_id TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS salary (
+        emp_id TEXT,
+        amount INTEGER NOT NULL,
+        payment_date DATE NOT NULL,
+        bank_details TEXT,
+        total_monthly_stipend INTEGER,
+        amount_deducted INTEGER,
+        payment_method TEXT,
+        FOREIGN KEY (emp_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
+        PRIMARY KEY (emp_id, payment_date)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attendance (
+        employee_id TEXT,
+        date DATE NOT NULL,
+        status TEXT CHECK(status IN ('Present', 'Absent')),
+        FOREIGN KEY (employee_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
+        PRIMARY KEY (employee_id, date)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leave_record (
+        emp_id TEXT,
+        leave_type TEXT,
+        start_date DATE,
+        end_date DATE,
+        status TEXT,
+        FOREIGN KEY (emp_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
+        PRIMARY KEY (emp_id, start_date, end_date)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        rule_title TEXT NOT NULL,
+        rule_description TEXT NOT NULL
+    );
+    """,
+    # Monthly summaries maintained by summaries.py; month is 'YYYY-MM'
+    """
+    CREATE TABLE IF NOT EXISTS attendance_monthly (
+        employee_id TEXT,
+        month TEXT NOT NULL,
+        present_days INTEGER NOT NULL,
+        absent_days INTEGER NOT NULL,
+        attendance_pct REAL NOT NULL,
+        longest_absence_streak INTEGER NOT NULL,
+        FOREIGN KEY (employee_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
+        PRIMARY KEY (employee_id, month)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payroll_monthly (
+        emp_id TEXT,
+        month TEXT NOT NULL,
+        payments INTEGER NOT NULL,
+        basic_amount INTEGER NOT NULL,
+        gross_stipend INTEGER NOT NULL,
+        deductions INTEGER NOT NULL,
+        FOREIGN KEY (emp_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
+        PRIMARY KEY (emp_id, month)
+    );
+    """,
+    # Output of payroll.run_payroll, one row per employee per month
+    """
+    CREATE TABLE IF NOT EXISTS payroll_run (
+        emp_id TEXT,
+        month TEXT NOT NULL,
+        gross_pay INTEGER NOT NULL,
+        working_days INTEGER NOT NULL,
+        absent_days INTEGER NOT NULL,
+        approved_leave_days INTEGER NOT NULL,
+        unapproved_absences INTEGER NOT NULL,
+        deduction INTEGER NOT NULL,
+        net_pay INTEGER NOT NULL,
+        FOREIGN KEY (emp_id) REFERENCES employee(emp_id) ON DELETE CASCADE,
+        PRIMARY KEY (month, emp_id)
+    );
+    """,
+    # (employee, month) pairs whose summaries are out of date
+    """
+    CREATE TABLE IF NOT EXISTS summary_dirty (
+        kind TEXT NOT NULL,
+        emp_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        PRIMARY KEY (kind, emp_id, month)
+    );
+    """,
+    # Background jobs run by jobs.py; payload holds an uploaded file until the job finishes
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        params TEXT NOT NULL,
+        payload BLOB,
+        status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'done', 'failed')),
+        progress INTEGER NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        error TEXT,
+        worker TEXT,
+        submitted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        started_at TEXT,
+        finished_at TEXT
+    );
+    """,
+    # Interval index over leave_record for org-wide date queries; one
+    # [start_day, end_day] box per leave, maintained by the triggers below
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS leave_index USING rtree_i32(
+        id, start_day, end_day,
+        +emp_id, +start_date, +end_date, +status
+    );
+    """,
+    # Secondary indexes for the page queries; the primary keys cover the rest.
+    # Checked by query_plans.py.
+    "CREATE INDEX IF NOT EXISTS idx_employee_department ON employee(department_id);",
+    "CREATE INDEX IF NOT EXISTS idx_salary_payment_date ON salary(payment_date);",
+    "CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date, status);",
+    "CREATE INDEX IF NOT EXISTS idx_leave_status ON leave_record(status);",
+    "CREATE INDEX IF NOT EXISTS idx_leave_dates ON leave_record(start_date, end_date);",
+    "CREATE INDEX IF NOT EXISTS idx_attendance_monthly_month ON attendance_monthly(month);",
+    "CREATE INDEX IF NOT EXISTS idx_payroll_monthly_month ON payroll_monthly(month);",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);",
+    # Every write to attendance or salary (forms, imports, deletes, cascades)
+    # marks the affected employee-month so summaries.refresh() can redo just those
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_insert_dirty AFTER INSERT ON attendance BEGIN
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('attendance', NEW.employee_id, substr(NEW.date, 1, 7));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_delete_dirty AFTER DELETE ON attendance BEGIN
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('attendance', OLD.employee_id, substr(OLD.date, 1, 7));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_update_dirty AFTER UPDATE ON attendance BEGIN
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('attendance', OLD.employee_id, substr(OLD.date, 1, 7));
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('attendance', NEW.employee_id, substr(NEW.date, 1, 7));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_salary_insert_dirty AFTER INSERT ON salary BEGIN
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('payroll', NEW.emp_id, substr(NEW.payment_date, 1, 7));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_salary_delete_dirty AFTER DELETE ON salary BEGIN
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('payroll', OLD.emp_id, substr(OLD.payment_date, 1, 7));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_salary_update_dirty AFTER UPDATE ON salary BEGIN
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('payroll', OLD.emp_id, substr(OLD.payment_date, 1, 7));
+        INSERT OR IGNORE INTO summary_dirty (kind, emp_id, month)
+        VALUES ('payroll', NEW.emp_id, substr(NEW.payment_date, 1, 7));
+    END;
+    """,
+    # A leave that is not Rejected may not overlap another one for the same
+    # employee. Existing leaves are disjoint, so the PK seek on (emp_id, start_date)
+    # only walks that employee's own history.
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_leave_record_insert_overlap BEFORE INSERT ON leave_record BEGIN
+        SELECT RAISE(ABORT, 'leave ends before it starts') WHERE NEW.end_date < NEW.start_date;
+        SELECT RAISE(ABORT, 'overlapping leave') WHERE NEW.status IS NOT 'Rejected' AND EXISTS (
+            SELECT 1 FROM leave_record
+            WHERE emp_id = NEW.emp_id AND start_date <= NEW.end_date AND end_date >= NEW.start_date
+              AND status IS NOT 'Rejected'
+        );
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_leave_record_update_overlap
+    BEFORE UPDATE OF emp_id, start_date, end_date, status ON leave_record BEGIN
+        SELECT RAISE(ABORT, 'leave ends before it starts') WHERE NEW.end_date < NEW.start_date;
+        SELECT RAISE(ABORT, 'overlapping leave') WHERE NEW.status IS NOT 'Rejected' AND EXISTS (
+            SELECT 1 FROM leave_record
+            WHERE emp_id = NEW.emp_id AND start_date <= NEW.end_date AND end_date >= NEW.start_date
+              AND status IS NOT 'Rejected' AND rowid != OLD.rowid
+        );
+    END;
+    """,
+    # leave_index holds one [start_day, end_day] box per leave, as whole julian
+    # day numbers (db.day_number)
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_leave_record_insert_index AFTER INSERT ON leave_record BEGIN
+        INSERT INTO leave_index (start_day, end_day, emp_id, start_date, end_date, status)
+        SELECT CAST(julianday(NEW.start_date) AS INTEGER), CAST(julianday(NEW.end_date) AS INTEGER),
+               NEW.emp_id, NEW.start_date, NEW.end_date, NEW.status
+        WHERE CAST(julianday(NEW.start_date) AS INTEGER) <= CAST(julianday(NEW.end_date) AS INTEGER);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_leave_record_delete_index AFTER DELETE ON leave_record BEGIN
+        DELETE FROM leave_index
+        WHERE start_day = CAST(julianday(OLD.start_date) AS INTEGER)
+          AND end_day = CAST(julianday(OLD.end_date) AS INTEGER) AND emp_id = OLD.emp_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_leave_record_update_index AFTER UPDATE ON leave_record BEGIN
+        DELETE FROM leave_index
+        WHERE start_day = CAST(julianday(OLD.start_date) AS INTEGER)
+          AND end_day = CAST(julianday(OLD.end_date) AS INTEGER) AND emp_id = OLD.emp_id;
+        INSERT INTO leave_index (start_day, end_day, emp_id, start_date, end_date, status)
+        SELECT CAST(julianday(NEW.start_date) AS INTEGER), CAST(julianday(NEW.end_date) AS INTEGER),
+               NEW.emp_id, NEW.start_date, NEW.end_date, NEW.status
+        WHERE CAST(julianday(NEW.start_date) AS INTEGER) <= CAST(julianday(NEW.end_date) AS INTEGER);
+    END;
+    """,
+)
+
+# Append-only trail of who changed what, written in batches by audit.py.
+# Rows are never updated; retention folds old days into per-day counts
+# (compacted = 1, entries = how many rows each stands for) and later deletes them.
+AUDIT_LOG_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY,
+        logged_at TEXT NOT NULL,
+        username TEXT,
+        action TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        record_id TEXT,
+        row_key TEXT,
+        detail TEXT,
+        entries INTEGER NOT NULL DEFAULT 1,
+        compacted INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_audit_record ON audit_log(table_name, record_id, logged_at);",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logged_at ON audit_log(logged_at);",
+    "CREATE INDEX IF NOT EXISTS idx_audit_user ON audit_log(username, logged_at);",
+    "CREATE TRIGGER IF NOT EXISTS trg_audit_log_append_only BEFORE UPDATE ON audit_log "
+    "BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END;",
+)
+
+
+# --- Backfills ---
+# A backfill is (table, key, work): the source table is walked in key order
+# and work(conn, where, params) handles the rows matching where, one bounded
+# slice per transaction. Slices end on a key boundary, so every row with the
+# same key lands in the same slice.
+def _key_range(key, low, high):
+    clauses, params = [], []
+    if low is not None:
+        clauses.append(f"{key} > ?")
+        params.append(low)
+    if high is not None:
+        clauses.append(f"{key} <= ?")
+        params.append(high)
+    return " AND ".join(clauses) or "1", params
+
+
+def _attendance_monthly(conn, where, params):
+    conn.execute(f"DELETE FROM attendance_monthly AS a WHERE {where}", params)
+    conn.execute(summaries.ATTENDANCE_SQL.format(source=f"attendance a WHERE {where}"), params)
+
+
+def _payroll_monthly(conn, where, params):
+    conn.execute(f"DELETE FROM payroll_monthly AS s WHERE {where}", params)
+    conn.execute(summaries.PAYROLL_SQL.format(source=f"salary s WHERE {where}"), params)
+
+
+def _leave_index(conn, where, params):
+    # The index triggers are live while this runs, so leaves written since the
+    # backfill started may already be indexed. The slice drops its rows' entries
+    # first (the R*Tree can't be read by the statement writing it), then
+    # indexes them once.
+    start, end = db.day_number("l.start_date"), db.day_number("l.end_date")
+    slice_rows = f"(SELECT * FROM leave_record l WHERE {where}) l"
+    conn.execute(f"""
+        DELETE FROM leave_index WHERE id IN (
+            SELECT i.id FROM {slice_rows}
+            JOIN leave_index i ON i.start_day = {start} AND i.end_day = {end} AND i.emp_id = l.emp_id
+        )
+    """, params)
+    conn.execute(db.LEAVE_INDEX_INSERT.format(start=start, end=end, row="l", source=f"FROM {slice_rows}"), params)
+
+
+# --- Migrations ---
+# (version, name, DDL statements, backfill or None). Append only: a version
+# that has shipped is never edited, and schema changes go in a new version. DDL runs in one transaction with the
+# version record; a backfill runs after it and the version is recorded when
+# the last slice commits.
+MIGRATIONS = (
+    (1, "baseline schema", BASELINE_SCHEMA, None),
+    (2, "backfill attendance_monthly", ("DELETE FROM summary_dirty WHERE kind = 'attendance'",),
+     ("attendance", "a.employee_id", _attendance_monthly)),
+    (3, "backfill payroll_monthly", ("DELETE FROM summary_dirty WHERE kind = 'payroll'",),
+     ("salary", "s.emp_id", _payroll_monthly)),
+    (4, "backfill leave_index", ("DELETE FROM leave_index",),
+     ("leave_record", "l.rowid", _leave_index)),
+    (5, "audit log", AUDIT_LOG_SCHEMA, None),
+)
+# Cached reads of these may be stale after a migration
+MIGRATED_TABLES = summaries.SUMMARY_TABLES + ("summary_dirty", "leave_record")
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+
+
+def _apply_ddl(pool, version, name, statements, has_backfill):
+    with pool.writer() as conn:
+        if version in applied_versions(conn):
+            return False
+        started = conn.execute("SELECT 1 FROM migration_progress WHERE version = ?", (version,)).fetchone()
+        if not started:
+            for statement in statements:
+                conn.execute(statement)
+            if has_backfill:
+                conn.execute("INSERT INTO migration_progress (version) VALUES (?)", (version,))
+        if not has_backfill:
+            conn.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+    return True
+
+
+def _run_backfill(pool, version, name, backfill, batch_size, progress):
+    table, key, work = backfill
+    alias = key.split(".")[0]
+    while True:
+        with pool.writer() as conn:
+            checkpoint = conn.execute(
+                "SELECT last_key, rows_done FROM migration_progress WHERE version = ?", (version,)
+            ).fetchone()
+            if checkpoint is None:
+                return  # another process finished it
+            last_key, rows_done = checkpoint
+            # The key batch_size rows ahead closes this slice; none left means the last one
+            where, params = _key_range(key, last_key, None)
+            row = conn.execute(
+                f"SELECT {key} FROM {table} {alias} WHERE {where} ORDER BY {key} LIMIT 1 OFFSET ?",
+                params + [batch_size - 1],
+            ).fetchone()
+            high = row[0] if row else None
+            where, params = _key_range(key, last_key, high)
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table} {alias} WHERE {where}", params).fetchone()[0]
+            work(conn, where, params)
+            if high is None:
+                conn.execute("DELETE FROM migration_progress WHERE version = ?", (version,))
+                conn.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+            else:
+                conn.execute(
+                    "UPDATE migration_progress SET last_key = ?, rows_done = ?, updated_at = CURRENT_TIMESTAMP "
+                    "WHERE version = ?", (high, rows_done + rows, version),
+                )
+        progress(version, name, rows_done + rows)
+        if high is None:
+            return
+        time.sleep(BACKFILL_PAUSE)
+
+
+def migrate(path=db.DB_PATH, batch_size=BACKFILL_BATCH, progress=None):
+    # Brings a database up to the latest version; safe to run concurrently
+    # and to resume after an interruption. Returns the versions it applied.
+    progress = progress or (lambda version, name, rows: None)
+    pool = db.get_pool(path)
+    with pool.writer() as conn:
+        for statement in TRACKING_SCHEMA:
+            conn.execute(statement)
+        done = applied_versions(conn)
+    applied = []
+    for version, name, statements, backfill in MIGRATIONS:
+        if version in done:
+            continue
+        _apply_ddl(pool, version, name, statements, backfill is not None)
+        if backfill is not None:
+            _run_backfill(pool, version, name, backfill, batch_size, progress)
+        applied.append(version)
+    if applied:
+        pool.bump(MIGRATED_TABLES)
+    return applied
+
+
+def status(path=db.DB_PATH):
+    # [(version, name, state)] with state 'applied', 'in progress (n rows)' or 'pending'
+    pool = db.get_pool(path)
+    with pool.reader() as conn:
+        tracked = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE name = 'schema_migrations')"
+        ).fetchone()[0]
+        done = applied_versions(conn) if tracked else set()
+        started = dict(conn.execute("SELECT version, rows_done FROM migration_progress")) if tracked else {}
+    states = []
+    for version, name, _, _ in MIGRATIONS:
+        if version in done:
+            state = "applied"
+        elif version in started:
+            state = f"in progress ({started[version]} rows)"
+        else:
+            state = "pending"
+        states.append((version, name, state))
+    return states
+
+
+if __name__ == "__main__":
+    # python migrations.py [migrate|status] [db path]
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command not in ("migrate", "status"):
+        sys.exit("usage: python migrations.py [migrate|status] [db path]")
+    target = sys.argv[2] if len(sys.argv) > 2 else db.DB_PATH
+    if command == "status":
+        for version, name, state in status(target):
+            print(f"{version:>4}  {name:40s} {state}")
+    else:
+        applied = migrate(target, progress=lambda version, name, rows: print(f"  {version} {name}: {rows} rows"))
+        print(f"Applied {len(applied)} migration(s)." if applied else "Already up to date.")
@@ -0,0 +1,122 @@
+import calendar
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import db
+import summaries
+
+PAYROLL_COLUMNS = [
+    "emp_id", "month", "gross_pay", "working_days", "absent_days",
+    "approved_leave_days", "unapproved_absences", "deduction", "net_pay",
+]
+
+
+def month_bounds(month):
+    # 'YYYY-MM' -> ('YYYY-MM-01', 'YYYY-MM-<last day>')
+    year, mon = (int(part) for part in month.split("-"))
+    last = calendar.monthrange(year, mon)[1]
+    return f"{month}-01", f"{month}-{last:02d}"
+
+
+# --- Inputs ---
+# Latest salary row per employee paid before the run; seeks on the salary PK.
+# CROSS JOIN keeps employee as the outer loop, so salary is never scanned.
+BASE_PAY_SQL = """
+    SELECT e.emp_id, s.amount, s.total_monthly_stipend
+    FROM employee e
+    CROSS JOIN salary s ON s.emp_id = e.emp_id
+     AND s.payment_date = (
+        SELECT MAX(payment_date) FROM salary
+        WHERE emp_id = e.emp_id AND payment_date < ?
+     )
+"""
+# Day counts come from the monthly summary; only absent days are read raw
+WORKING_DAYS_SQL = """
+    SELECT employee_id AS emp_id, present_days + absent_days AS working_days
+    FROM attendance_monthly WHERE month = ?
+"""
+ABSENCES_SQL = (
+    "SELECT employee_id AS emp_id, date FROM attendance WHERE date BETWEEN ? AND ? AND status = 'Absent'"
+)
+APPROVED_LEAVE_SQL = """
+    SELECT emp_id, start_date, end_date FROM leave_record
+    WHERE status = 'Approved' AND start_date <= ? AND end_date >= ?
+"""
+
+
+def load_inputs(month, path=db.DB_PATH):
+    start, end = month_bounds(month)
+    next_month = (datetime.date.fromisoformat(end) + datetime.timedelta(days=1)).isoformat()
+
+    def frame(sql, params):
+        columns, rows = db.read_query(sql, params, path)
+        return pd.DataFrame(rows, columns=columns)
+
+    return (
+        frame(BASE_PAY_SQL, (next_month,)),
+        frame(WORKING_DAYS_SQL, (month,)),
+        frame(ABSENCES_SQL, (start, end)),
+        frame(APPROVED_LEAVE_SQL, (end, start)),
+    )
+
+
+# --- Computation ---
+def compute_payroll(month, base, days, absences, leaves):
+    # Column operations only; no per-employee Python loop
+    result = base.set_index("emp_id")
+    stipend = result["total_monthly_stipend"].fillna(0).astype("int64")
+    amount = result["amount"].fillna(0).astype("int64")
+    gross = pd.Series(np.where(stipend > 0, stipend, amount), index=result.index, dtype="int64")
+
+    working = days.set_index("emp_id")["working_days"]
+    absent = absences.groupby("emp_id").size()
+
+    # Absences that fall inside an approved leave are not deducted
+    if len(absences) and len(leaves):
+        covered = absences.merge(leaves, on="emp_id")
+        covered = covered[(covered["date"] >= covered["start_date"]) & (covered["date"] <= covered["end_date"])]
+        approved = covered.drop_duplicates(["emp_id", "date"]).groupby("emp_id").size()
+    else:
+        approved = pd.Series(dtype="int64")
+
+    out = pd.DataFrame({"gross_pay": gross})
+    out["working_days"] = working.reindex(out.index, fill_value=0).astype("int64")
+    out["absent_days"] = absent.reindex(out.index, fill_value=0).astype("int64")
+    out["approved_leave_days"] = approved.reindex(out.index, fill_value=0).astype("int64")
+    out["unapproved_absences"] = out["absent_days"] - out["approved_leave_days"]
+
+    # Daily rate is gross over the days attendance was recorded this month
+    worked = out["working_days"].to_numpy()
+    per_day = np.divide(out["gross_pay"].to_numpy(), worked, out=np.zeros(len(out)), where=worked > 0)
+    out["deduction"] = np.rint(per_day * out["unapproved_absences"].to_numpy()).astype("int64")
+    out["net_pay"] = out["gross_pay"] - out["deduction"]
+    out["month"] = month
+    return out.reset_index()[PAYROLL_COLUMNS]
+
+
+# --- Run ---
+def run_payroll(month, path=db.DB_PATH):
+    summaries.refresh(path)
+    result = compute_payroll(month, *load_inputs(month, path))
+    records = result.astype(object).to_numpy().tolist()
+    pool = db.get_pool(path)
+    # Re-running a month replaces it; both statements share one transaction
+    with pool.writer() as conn:
+        conn.execute("DELETE FROM payroll_run WHERE month = ?", (month,))
+        conn.executemany(
+            f"INSERT INTO payroll_run ({', '.join(PAYROLL_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(PAYROLL_COLUMNS))})",
+            records,
+        )
+    pool.bump(("payroll_run",))
+    return result
+
+
+def payroll_totals(month, path=db.DB_PATH):
+    return db.read_query("""
+        SELECT COUNT(*) AS employees, SUM(gross_pay) AS gross_pay,
+               SUM(deduction) AS deductions, SUM(net_pay) AS net_pay
+        FROM payroll_run WHERE month = ?
+    """, (month,), path, ("payroll_run",))
@@ -0,0 +1,138 @@
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+import db
+import leave_calendar
+import migrations
+import payroll
+import summaries
+
+# Tables that grow with headcount or time; a plain SCAN on these is a bug
+LARGE_TABLES = ("employee", "salary", "attendance", "leave_record", "audit_log")
+# (query, table) pairs that scan on purpose: each returns or aggregates a row
+# for every employee, so an index would not save any reads
+ALLOWED_SCANS = {
+    ("employee ids", "employee"),
+    ("payroll base pay", "employee"),
+    ("summary by department", "employee"),
+    ("summary by employee", "employee"),
+    ("leave coverage", "employee"),
+}
+
+
+def page_queries():
+    # (name, sql, params) for every query the pages issue against large tables
+    queries = []
+    for table, (select, keys, _) in db.LISTING_QUERIES.items():
+        first = f"{select} ORDER BY {', '.join(keys)} LIMIT ?"
+        seek = (f"{select} WHERE ({', '.join(keys)}) > ({', '.join('?' * len(keys))}) "
+                f"ORDER BY {', '.join(keys)} LIMIT ?")
+        queries.append((f"{table} first page", first, (51,)))
+        queries.append((f"{table} next page", seek, ("x",) * len(keys) + (51,)))
+        for name, clause in db.LISTING_FILTERS.get(table, {}).items():
+            filtered = f"{select} WHERE {clause} ORDER BY {', '.join(keys)} LIMIT ?"
+            queries.append((f"{table} filtered by {name}", filtered, ("x", 51)))
+    queries += [
+        ("employee ids", "SELECT emp_id FROM employee", ()),
+        ("employee by department", "SELECT * FROM employee WHERE department_id = ?", ("D1",)),
+        ("attendance by date range", "SELECT * FROM attendance WHERE date BETWEEN ? AND ?", ("2025-01-01", "2025-01-31")),
+        ("salary by payment date", "SELECT * FROM salary WHERE payment_date BETWEEN ? AND ?", ("2025-01-01", "2025-01-31")),
+        ("leave by status", "SELECT * FROM leave_record WHERE status = ?", ("Pending",)),
+        ("leave overlap check", "SELECT 1 FROM leave_record WHERE emp_id = ? AND start_date <= ? AND end_date >= ?",
+         ("E1", "2025-01-31", "2025-01-01")),
+        ("leave calendar window", f"SELECT * FROM leave_index WHERE start_day <= {db.day_number('?')} "
+         f"AND end_day >= {db.day_number('?')}", ("2025-01-31", "2025-01-01")),
+    ]
+    history = ("SELECT id, logged_at, username, action, table_name, record_id, row_key, detail, entries "
+               "FROM audit_log")
+    newest = "ORDER BY logged_at DESC, id DESC LIMIT ?"
+    queries += [
+        ("audit newest", f"{history} {newest}", (1000,)),
+        ("audit by record", f"{history} WHERE table_name = ? AND record_id = ? {newest}", ("salary", "E1", 1000)),
+        ("audit by table and time", f"{history} WHERE table_name = ? AND logged_at >= ? AND logged_at < ? {newest}",
+         ("salary", "2025-01-01", "2025-02-01", 1000)),
+        ("audit by user", f"{history} WHERE username = ? {newest}", ("ADMIN", 1000)),
+        ("audit compaction day", "SELECT username, action, table_name, SUM(entries) FROM audit_log "
+         "WHERE logged_at >= ? AND logged_at < ? AND compacted = 0 GROUP BY username, action, table_name",
+         ("2025-01-01", "2025-01-02")),
+    ]
+    month, start, end = "2025-01", "2025-01-01", "2025-01-31"
+    statuses = leave_calendar.OUT_STATUSES
+    queries += [
+        ("summary months", summaries.MONTHS_SQL, ()),
+        ("summary by department", summaries.DEPARTMENT_SUMMARY_SQL, (month, month)),
+        ("summary by employee", summaries.EMPLOYEE_SUMMARY_SQL.format(where=""), (month, month)),
+        ("summary by employee in department",
+         summaries.EMPLOYEE_SUMMARY_SQL.format(where="AND e.department_id = ?"), (month, month, "D1")),
+        ("leave conflicts", leave_calendar.CONFLICTS_SQL, ("E1", end, start)),
+        ("leave who is out", leave_calendar.WHO_IS_OUT_SQL.format(statuses=leave_calendar._in(statuses), where=""),
+         (end, start) + tuple(statuses)),
+        ("leave coverage", leave_calendar.COVERAGE_SQL.format(statuses=leave_calendar._in(statuses), where=""),
+         (start, end, start, leave_calendar.MAX_RANGE_DAYS) + tuple(statuses)),
+        ("leave attendance mismatches", leave_calendar.MISMATCHES_SQL, (start, end, start, end, end, start)),
+        ("payroll base pay", payroll.BASE_PAY_SQL, ("2025-02-01",)),
+        ("payroll working days", payroll.WORKING_DAYS_SQL, (month,)),
+        ("payroll absences", payroll.ABSENCES_SQL, (start, end)),
+        ("payroll approved leave", payroll.APPROVED_LEAVE_SQL, (end, start)),
+    ]
+    return queries
+
+
+def aliases(sql):
+    # alias -> table for every "FROM/JOIN table alias" in the query; plans name
+    # aliased tables by their alias
+    found = {}
+    for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.I):
+        if alias and alias.upper() not in ("ON", "WHERE", "JOIN", "LEFT", "CROSS", "INNER", "GROUP", "ORDER",
+                                           "UNION", "LIMIT"):
+            found[alias] = table
+    return found
+
+
+def full_scans(conn, name, sql, params):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    names = aliases(sql)
+    limited = re.search(r"\bLIMIT\s+\?\s*$", sql.strip()) is not None
+    bad = []
+    for row in plan:
+        detail = row[-1]
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        # An index walk is fine when a LIMIT stops it, as in the keyset pages
+        if not match or ("INDEX" in detail and limited):
+            continue
+        table = names.get(match.group(1), match.group(1))
+        if table in LARGE_TABLES and (name, table) not in ALLOWED_SCANS:
+            bad.append(detail)
+    return bad
+
+
+def audit(conn):
+    failures = []
+    for name, sql, params in page_queries():
+        for detail in full_scans(conn, name, sql, params):
+            failures.append((name, detail))
+    return failures
+
+
+def main(path=None):
+    # Audits a freshly migrated scratch database unless pointed at a real one
+    with tempfile.TemporaryDirectory() as tmp:
+        if path is None:
+            path = os.path.join(tmp, "plans.db")
+            migrations.migrate(path)
+            db.get_pool(path).close()
+        conn = sqlite3.connect(path)
+        failures = audit(conn)
+        conn.close()
+    for name, detail in failures:
+        print(f"FULL SCAN  {name}: {detail}")
+    if not failures:
+        print(f"OK  {len(page_queries())} page queries use indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,178 @@
+import sys
+
+import db
+
+ATTENDANCE_TARGET_PCT = 90  # "Minimum 90% monthly attendance is mandatory"
+ABSENCE_STREAK_LIMIT = 3    # "Continuous absence of 3 days"
+
+# {source} is either the whole attendance table or only the dirty
+# employee-months joined against it; the PK (employee_id, date) serves both.
+ATTENDANCE_SQL = """
+    INSERT INTO attendance_monthly
+        (employee_id, month, present_days, absent_days, attendance_pct, longest_absence_streak)
+    WITH scoped AS (
+        SELECT a.employee_id, substr(a.date, 1, 7) AS month, a.date, a.status
+        FROM {source}
+    ),
+    runs AS (
+        -- gaps and islands: consecutive rows with the same status share a run id
+        SELECT employee_id, month, status,
+               ROW_NUMBER() OVER (PARTITION BY employee_id, month ORDER BY date)
+             - ROW_NUMBER() OVER (PARTITION BY employee_id, month, status ORDER BY date) AS run
+        FROM scoped
+    ),
+    streaks AS (
+        SELECT employee_id, month, MAX(days) AS longest
+        FROM (
+            SELECT employee_id, month, run, COUNT(*) AS days
+            FROM runs WHERE status = 'Absent'
+            GROUP BY employee_id, month, run
+        )
+        GROUP BY employee_id, month
+    )
+    SELECT s.employee_id, s.month,
+           SUM(s.status = 'Present'),
+           SUM(s.status = 'Absent'),
+           ROUND(100.0 * SUM(s.status = 'Present') / COUNT(*), 2),
+           COALESCE(MAX(k.longest), 0)
+    FROM scoped s
+    LEFT JOIN streaks k ON k.employee_id = s.employee_id AND k.month = s.month
+    GROUP BY s.employee_id, s.month
+"""
+
+PAYROLL_SQL = """
+    INSERT INTO payroll_monthly
+        (emp_id, month, payments, basic_amount, gross_stipend, deductions)
+    SELECT s.emp_id, substr(s.payment_date, 1, 7),
+           COUNT(*),
+           SUM(s.amount),
+           COALESCE(SUM(s.total_monthly_stipend), 0),
+           COALESCE(SUM(s.amount_deducted), 0)
+    FROM {source}
+    GROUP BY s.emp_id, substr(s.payment_date, 1, 7)
+"""
+
+DIRTY_ATTENDANCE = """
+    attendance a
+    JOIN summary_dirty d ON d.kind = 'attendance'
+        AND a.employee_id = d.emp_id
+        AND a.date >= d.month || '-01' AND a.date < d.month || '-32'
+"""
+
+DIRTY_PAYROLL = """
+    salary s
+    JOIN summary_dirty d ON d.kind = 'payroll'
+        AND s.emp_id = d.emp_id
+        AND s.payment_date >= d.month || '-01' AND s.payment_date < d.month || '-32'
+"""
+
+SUMMARY_TABLES = ("attendance_monthly", "payroll_monthly")
+# Every write that can leave summary_dirty non-empty bumps one of these
+SOURCE_TABLES = ("attendance", "salary", "summary_dirty")
+
+
+# --- Refresh ---
+def refresh_dirty(conn):
+    # Recompute only the employee-months the triggers have marked
+    pending = conn.execute("SELECT COUNT(*) FROM summary_dirty").fetchone()[0]
+    if not pending:
+        return 0
+    conn.execute("""
+        DELETE FROM attendance_monthly WHERE (employee_id, month) IN
+            (SELECT emp_id, month FROM summary_dirty WHERE kind = 'attendance')
+    """)
+    conn.execute("""
+        DELETE FROM payroll_monthly WHERE (emp_id, month) IN
+            (SELECT emp_id, month FROM summary_dirty WHERE kind = 'payroll')
+    """)
+    conn.execute(ATTENDANCE_SQL.format(source=DIRTY_ATTENDANCE))
+    conn.execute(PAYROLL_SQL.format(source=DIRTY_PAYROLL))
+    conn.execute("DELETE FROM summary_dirty")
+    return pending
+
+
+def rebuild_all(conn):
+    for table in SUMMARY_TABLES + ("summary_dirty",):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute(ATTENDANCE_SQL.format(source="attendance a"))
+    conn.execute(PAYROLL_SQL.format(source="salary s"))
+
+
+def refresh(path=db.DB_PATH):
+    # Cached check first so page views don't take the write lock for nothing
+    _, rows = db.read_query("SELECT EXISTS (SELECT 1 FROM summary_dirty)", path=path, tables=SOURCE_TABLES)
+    if not rows[0][0]:
+        return 0
+    pool = db.get_pool(path)
+    with pool.writer() as conn:
+        refreshed = refresh_dirty(conn)
+    pool.bump(SUMMARY_TABLES + ("summary_dirty",))
+    return refreshed
+
+
+def rebuild(path=db.DB_PATH):
+    pool = db.get_pool(path)
+    with pool.writer() as conn:
+        rebuild_all(conn)
+    pool.bump(SUMMARY_TABLES + ("summary_dirty",))
+
+
+# --- Dashboard queries ---
+# Pay figures; hidden from roles without auth "view_pay"
+PAY_COLUMNS = ("basic_amount", "gross_stipend", "deductions")
+MONTHS_SQL = (
+    "SELECT DISTINCT month FROM attendance_monthly "
+    "UNION SELECT DISTINCT month FROM payroll_monthly ORDER BY 1 DESC"
+)
+DEPARTMENT_SUMMARY_SQL = f"""
+    SELECT e.department_id,
+           COUNT(DISTINCT e.emp_id) AS employees,
+           ROUND(AVG(a.attendance_pct), 2) AS avg_attendance_pct,
+           SUM(a.attendance_pct < {ATTENDANCE_TARGET_PCT}) AS below_target,
+           SUM(a.longest_absence_streak >= {ABSENCE_STREAK_LIMIT}) AS absence_streaks,
+           COALESCE(SUM(p.gross_stipend), 0) AS gross_stipend,
+           COALESCE(SUM(p.deductions), 0) AS deductions
+    FROM employee e
+    LEFT JOIN attendance_monthly a ON a.employee_id = e.emp_id AND a.month = ?
+    LEFT JOIN payroll_monthly p ON p.emp_id = e.emp_id AND p.month = ?
+    WHERE a.employee_id IS NOT NULL OR p.emp_id IS NOT NULL
+    GROUP BY e.department_id
+    ORDER BY e.department_id
+"""
+# {where} narrows to one department
+EMPLOYEE_SUMMARY_SQL = """
+    SELECT e.emp_id, e.name, e.department_id,
+           a.present_days, a.absent_days, a.attendance_pct, a.longest_absence_streak,
+           p.basic_amount, p.gross_stipend, p.deductions
+    FROM employee e
+    LEFT JOIN attendance_monthly a ON a.employee_id = e.emp_id AND a.month = ?
+    LEFT JOIN payroll_monthly p ON p.emp_id = e.emp_id AND p.month = ?
+    WHERE (a.employee_id IS NOT NULL OR p.emp_id IS NOT NULL) {where}
+    ORDER BY e.emp_id
+"""
+
+
+def months(path=db.DB_PATH):
+    return db.read_column(MONTHS_SQL, path=path, tables=SUMMARY_TABLES)
+
+
+def department_summary(month, path=db.DB_PATH):
+    return db.read_arrow(DEPARTMENT_SUMMARY_SQL, (month, month), path, SUMMARY_TABLES + ("employee",))
+
+
+def employee_summary(month, department_id=None, path=db.DB_PATH):
+    where = "AND e.department_id = ?" if department_id else ""
+    params = (month, month, department_id) if department_id else (month, month)
+    return db.read_arrow(EMPLOYEE_SUMMARY_SQL.format(where=where), params, path, SUMMARY_TABLES + ("employee",))
+
+
+def without_pay(table):
+    return table.select([name for name in table.column_names if name not in PAY_COLUMNS])
+
+
+if __name__ == "__main__":
+    # python summaries.py rebuild [db path]
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python summaries.py rebuild [db path]")
+    rebuild(sys.argv[2] if len(sys.argv) > 2 else db.DB_PATH)
+    print("Summary tables rebuilt.")
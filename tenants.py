@@ -0,0 +1,161 @@
+import os
+import pathlib
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+import db
+import migrations
+
+# The directory maps each subsidiary to its own shard file and each login to
+# a subsidiary. Shard paths are relative to the directory's folder.
+DIRECTORY_PATH = os.environ.get("HRM_DIRECTORY_DB", "directory.db")
+DEFAULT_TENANT = "main"
+MAX_PARALLEL_SHARDS = 8
+ORG_TOTALS_TTL = 60
+
+DIRECTORY_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS tenants (
+        tenant_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        db_path TEXT NOT NULL UNIQUE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tenant_users (
+        username TEXT PRIMARY KEY,
+        tenant_id TEXT NOT NULL,
+        FOREIGN KEY (tenant_id) REFERENCES tenants(tenant_id) ON DELETE CASCADE
+    );
+    """,
+    # Logins; password_hash carries its KDF and parameters (see auth.py)
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password_hash TEXT NOT NULL,
+        role TEXT NOT NULL,
+        must_change INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        password_changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+)
+
+
+# --- Directory ---
+def create_directory(conn):
+    # The directory keeps its own audit trail of changes to logins
+    for statement in DIRECTORY_SCHEMA + migrations.AUDIT_LOG_SCHEMA:
+        conn.execute(statement)
+    # The original single database becomes the default subsidiary
+    conn.execute("INSERT OR IGNORE INTO tenants VALUES (?, 'Main', ?)", (DEFAULT_TENANT, db.DB_PATH))
+
+
+@st.cache_resource
+def init_directory(path=DIRECTORY_PATH):
+    with db.get_pool(path).writer() as conn:
+        create_directory(conn)
+    return True
+
+
+def shard_path(db_path, directory=DIRECTORY_PATH):
+    if os.path.isabs(db_path):
+        return db_path
+    return os.path.join(os.path.dirname(directory), db_path)
+
+
+def tenants(directory=DIRECTORY_PATH):
+    # [(tenant_id, name, shard path)]
+    # Uncached: the CLI below edits the directory from another process
+    _, rows = db.read_query("SELECT tenant_id, name, db_path FROM tenants ORDER BY tenant_id", path=directory)
+    return [(tenant_id, name, shard_path(path, directory)) for tenant_id, name, path in rows]
+
+
+def tenant_for(username, directory=DIRECTORY_PATH):
+    # Logins without an assignment land in the default subsidiary
+    _, rows = db.read_query("""
+        SELECT t.tenant_id, t.name, t.db_path FROM tenants t
+        LEFT JOIN tenant_users u ON u.tenant_id = t.tenant_id AND u.username = ?
+        WHERE u.username IS NOT NULL OR t.tenant_id = ?
+        ORDER BY u.username IS NULL
+        LIMIT 1
+    """, (username, DEFAULT_TENANT), directory)
+    tenant_id, name, path = rows[0]
+    return tenant_id, name, shard_path(path, directory)
+
+
+def add_tenant(tenant_id, name, db_path, directory=DIRECTORY_PATH):
+    # The shard gets its schema before it is listed, so logins never land on an empty file
+    path = shard_path(db_path, directory)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    migrations.migrate(path)
+    db.execute_write("INSERT INTO tenants VALUES (?, ?, ?)", (tenant_id, name, db_path), ("tenants",), directory)
+
+
+def assign_user(username, tenant_id, directory=DIRECTORY_PATH):
+    db.execute_write(
+        "INSERT OR REPLACE INTO tenant_users VALUES (?, ?)", (username, tenant_id), ("tenant_users",), directory
+    )
+
+
+# --- Cross-shard aggregation ---
+# Every shard is opened read-only on its own connection, never through its
+# pool, so org-wide reports cannot block a subsidiary's writes.
+SHARD_TOTALS_SQL = """
+    SELECT (SELECT COUNT(*) FROM employee),
+           (SELECT COUNT(*) FROM department),
+           COUNT(*), COALESCE(SUM(gross_pay), 0), COALESCE(SUM(deduction), 0), COALESCE(SUM(net_pay), 0)
+    FROM payroll_run WHERE month = ?
+"""
+ORG_COLUMNS = ["tenant_id", "name", "employees", "departments", "payroll_employees",
+               "gross_pay", "deductions", "net_pay", "error"]
+
+
+def _shard_totals(tenant, month):
+    tenant_id, name, path = tenant
+    try:
+        conn = sqlite3.connect(pathlib.Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+        try:
+            row = conn.execute(SHARD_TOTALS_SQL, (month,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        # A missing or out-of-date shard is reported, not fatal
+        return (tenant_id, name) + (None,) * 6 + (str(e),)
+    return (tenant_id, name) + tuple(row) + (None,)
+
+
+@st.cache_data(ttl=ORG_TOTALS_TTL, show_spinner=False)
+def _org_totals(month, shards):
+    # One row per subsidiary, queried in parallel (sqlite3 releases the GIL
+    # while a statement runs), plus an org-wide total row
+    import pandas as pd
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL_SHARDS, len(shards)))) as pool:
+        rows = list(pool.map(lambda tenant: _shard_totals(tenant, month), shards))
+    df = pd.DataFrame(rows, columns=ORG_COLUMNS)
+    totals = df[ORG_COLUMNS[2:-1]].sum(min_count=1)
+    df.loc[len(df)] = ["All", "Organization"] + totals.tolist() + [None]
+    return df
+
+
+def org_totals(month, directory=DIRECTORY_PATH):
+    # Other shards' writes can't expire this cache, hence the TTL; a new
+    # subsidiary changes the key and shows up at once
+    return _org_totals(month, tuple(tenants(directory)))
+
+
+if __name__ == "__main__":
+    # python tenants.py add <tenant_id> <name> <db path> | assign <username> <tenant_id>
+    if len(sys.argv) == 5 and sys.argv[1] == "add":
+        init_directory()
+        add_tenant(*sys.argv[2:])
+        print(f"Added subsidiary {sys.argv[2]}.")
+    elif len(sys.argv) == 4 and sys.argv[1] == "assign":
+        init_directory()
+        assign_user(sys.argv[2].upper(), sys.argv[3])
+        print(f"Assigned {sys.argv[2].upper()} to {sys.argv[3]}.")
+    else:
+        sys.exit("usage: python tenants.py add <tenant_id> <name> <db path> | assign <username> <tenant_id>")
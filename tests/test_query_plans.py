@@ -0,0 +1,18 @@
+import sqlite3
+
+import db
+import migrations
+import query_plans
+
+
+def test_page_queries_use_indexes(tmp_path):
+    # Any full scan of a large table outside query_plans.ALLOWED_SCANS fails,
+    # on the schema a freshly migrated database gets
+    path = str(tmp_path / "plans.db")
+    migrations.migrate(path)
+    db.get_pool(path).close()
+    conn = sqlite3.connect(path)
+    try:
+        assert query_plans.audit(conn) == []
+    finally:
+        conn.close()